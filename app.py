@@ -1,14 +1,21 @@
 # app.py
 import streamlit as st
-import joblib
 import plotly.express as px
 import plotly.graph_objects as go
 from mhlw_data_processor import MHLWDataProcessor
+from model_registry import get_model_registry
+from history_store import get_history_store
+from health_assessment import calculate_bmi_status, calculate_health_risks
+from lifestyle_advice import generate_lifestyle_advice
+from user_store import get_user_store
+from password_hashing import hash_password_in_pool, verify_and_upgrade_in_pool
+from prediction_log import get_prediction_logger, make_prediction_record
+from latency_metrics import get_latency_metrics
 import numpy as np
 from datetime import datetime
 import json
 import os
-import hashlib
+import time
 
 # ページ設定を最初に実行（他のstコマンドより前に配置）
 st.set_page_config(
@@ -19,6 +26,7 @@ st.set_page_config(
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
 USER_HISTORY_DIR = os.path.join(BASE_DIR, "user_history")
+HISTORY_PAGE_SIZE = 20
 DEFAULT_VALUES = {
     'age': 30,
     'height': 170.0,
@@ -53,9 +61,6 @@ def init_user_data():
         print(f"Error in init_user_data: {str(e)}")
         st.error("データ初期化中にエラーが発生しました")
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def register_user(username, password):
     """ユーザー登録を行う関数"""
     try:
@@ -68,30 +73,14 @@ def register_user(username, password):
         if len(password) < 6:
             return False, "パスワードは6文字以上にしてください"
         
-        # users.jsonファイルの存在確認
-        if not os.path.exists(USERS_FILE):
-            with open(USERS_FILE, "w", encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
-        
-        with open(USERS_FILE, "r", encoding='utf-8') as f:
-            users = json.load(f)
-        
-        if username in users:
-            return False, "このユーザー名は既に使用されています"
-        
-        users[username] = {
-            "password": hash_password(password),
+        record = {
+            "password": hash_password_in_pool(password),
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M")
         }
         
-        with open(USERS_FILE, "w", encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
-        
-        # ユーザーの履歴ファイルを作成
-        user_history_file = os.path.join(USER_HISTORY_DIR, f"{username}.json")
-        if not os.path.exists(user_history_file):
-            with open(user_history_file, "w", encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False)
+        # ファイルロック下で最新の内容を読み直してから追加する
+        if not get_user_store().add(username, record):
+            return False, "このユーザー名は既に使用されています"
         
         return True, "登録が完了しました"
     except Exception as e:
@@ -104,41 +93,58 @@ def authenticate_user(username, password):
         if not username or not password:
             return False, "ユーザー名とパスワードを入力してください"
         
-        if not os.path.exists(USERS_FILE):
+        store = get_user_store()
+        if not store.exists():
             return False, "ユーザーデータが見つかりません"
         
-        with open(USERS_FILE, "r", encoding='utf-8') as f:
-            users = json.load(f)
-        
-        if username not in users:
+        # メモリ上の索引を引く（users.jsonが更新された場合のみ読み直す）
+        user = store.get(username)
+        if user is None:
             return False, "ユーザー名が見つかりません"
         
-        if users[username]["password"] != hash_password(password):
+        # ハッシュの検証はスレッドプールで行い、旧形式なら新しい形式に更新する
+        matched, new_hash = verify_and_upgrade_in_pool(password, user["password"])
+        if not matched:
             return False, "パスワードが正しくありません"
+        if new_hash is not None:
+            store.update(username, {"password": new_hash})
         
         return True, "ログインに成功しました"
     except Exception as e:
         print(f"Error in authenticate_user: {str(e)}")
         return False, "認証中にエラーが発生しました"
 
+def is_admin(username):
+    """管理者ユーザー（users.json の role が "admin"）かどうかを返す関数"""
+    user = get_user_store().get(username) if username else None
+    return user is not None and user.get("role") == "admin"
+
+def render_latency_metrics():
+    """処理段階ごとのレイテンシ（p50/p95/p99）を表示する関数（管理者用）"""
+    summary = get_latency_metrics().summary()
+    if not summary:
+        st.info("まだ計測データがありません。")
+        return
+
+    rows = [
+        {
+            "段階": stage,
+            "件数": values["count"],
+            "平均(ms)": values["mean"] * 1000,
+            "p50(ms)": values["p50"] * 1000,
+            "p95(ms)": values["p95"] * 1000,
+            "p99(ms)": values["p99"] * 1000,
+            "最大(ms)": values["max"] * 1000,
+        }
+        for stage, values in summary.items()
+    ]
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    st.caption("集計結果は logs/latency_metrics.json と logs/latency_metrics.prom にも定期的に書き出されます。")
+
 def save_user_history(username, result):
     """ユーザーの診断履歴を保存する関数"""
     try:
-        history_file = os.path.join(USER_HISTORY_DIR, f"{username}.json")
-        os.makedirs(os.path.dirname(history_file), exist_ok=True)
-        
-        history = []
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, "r", encoding='utf-8') as f:
-                    history = json.load(f)
-            except json.JSONDecodeError:
-                history = []
-        
-        history.append(result)
-        
-        with open(history_file, "w", encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        get_history_store().append(username, result)
     except Exception as e:
         print(f"Error in save_user_history: {str(e)}")
         st.error("履歴の保存中にエラーが発生しました")
@@ -146,61 +152,48 @@ def save_user_history(username, result):
 def load_user_history(username):
     """ユーザーの診断履歴を読み込む関数"""
     try:
-        history_file = os.path.join(USER_HISTORY_DIR, f"{username}.json")
-        
-        if not os.path.exists(history_file):
-            os.makedirs(os.path.dirname(history_file), exist_ok=True)
-            with open(history_file, "w", encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-            return []
-            
-        with open(history_file, "r", encoding='utf-8') as f:
-            return json.load(f)
+        return get_history_store().load(username)
     except Exception as e:
         print(f"Error in load_user_history: {str(e)}")
         return []
 
-def calculate_bmi_status(bmi, age, gender):
-    """BMIステータスを計算する関数"""
-    # 年齢による判定基準の調整
-    if age < 18:
-        if bmi < 16:
-            return "痩せすぎ", "🔵", "#e3f2fd", "体重増加が必要かもしれません。"
-        elif bmi < 17:
-            return "痩せ気味", "🔵", "#e3f2fd", "もう少し体重を増やすことを検討してください。"
-        elif bmi < 25:
-            return "普通体重", "🟢", "#e8f5e9", "健康的な体重です。"
-        elif bmi < 30:
-            return "やや体重過多", "🟡", "#fff3e0", "適度な運動を心がけましょう。"
-        else:
-            return "体重過多", "🔴", "#ffebee", "生活習慣の改善を検討してください。"
-    elif age >= 65:
-        if bmi < 18.5:
-            return "低体重", "🔵", "#e3f2fd", "栄養バランスの改善を検討してください。"
-        elif bmi < 25:
-            return "普通体重", "🟢", "#e8f5e9", "健康的な体重を維持できています。"
-        elif bmi < 27:
-            return "やや高め", "🟡", "#fff3e0", "現状維持か、緩やかな改善を目指しましょう。"
-        else:
-            return "高体重", "🟠", "#fbe9e7", "徐々に改善を目指しましょう。"
-    else:
-        # 一般成人の判定基準（日本肥満学会の基準に基づく）
-        if bmi < 16:
-            return "痩せすぎ", "🔵", "#e3f2fd", "医療機関での相談をお勧めします。"
-        elif bmi < 17:
-            return "痩せ", "🔵", "#e3f2fd", "体重増加を検討してください。"
-        elif bmi < 18.5:
-            return "軽度痩せ", "🔵", "#e3f2fd", "もう少し体重を増やすことを検討してください。"
-        elif bmi < 25:
-            return "普通体重", "🟢", "#e8f5e9", "健康的な体重です。このまま維持しましょう。"
-        elif bmi < 30:
-            return "肥満（1度）", "🟡", "#fff3e0", "生活習慣の見直しを検討してください。"
-        elif bmi < 35:
-            return "肥満（2度）", "🟠", "#fbe9e7", "計画的な改善をお勧めします。"
-        elif bmi < 40:
-            return "肥満（3度）", "🔴", "#ffebee", "医療機関での相談をお勧めします。"
-        else:
-            return "肥満（4度）", "🔴", "#ffebee", "至急、医療機関での相談をお勧めします。"
+def load_user_history_page(username, page_size=HISTORY_PAGE_SIZE, cursor=None):
+    """ユーザーの診断履歴を新しい順に1ページ分読み込む関数"""
+    try:
+        return get_history_store().page(username, page_size=page_size, cursor=cursor)
+    except Exception as e:
+        print(f"Error in load_user_history_page: {str(e)}")
+        return [], None
+
+def reset_history_view():
+    """履歴タブの表示状態（読み込み済みページ）をリセットする関数"""
+    st.session_state.history_records = None
+    st.session_state.history_cursor = None
+
+def render_history_card(result):
+    """履歴1件分のHTMLを生成する関数"""
+    return f"""
+    <div class="history-card">
+        <div class="history-date">{result['datetime']}</div>
+        <div style="display: flex; justify-content: space-between; margin-bottom: 1rem;">
+            <div>性別: {result['gender']}</div>
+            <div>年齢: {result['age']}歳</div>
+            <div>身長: {result['height']:.1f}cm</div>
+            <div>体重: {result['weight']:.1f}kg</div>
+        </div>
+        <div style="display: flex; align-items: center; margin-bottom: 1rem;">
+            <div style="font-size: 1.2rem; margin-right: 1rem;">
+                BMI: <strong>{result['bmi']:.1f}</strong>
+            </div>
+            <div style="font-size: 1.2rem;">
+                判定: <strong>{result.get('color', '')} {result.get('status', '-')}</strong>
+            </div>
+        </div>
+        <div style="color: #666; font-style: italic;">
+            {result.get('advice', '判定結果に基づいて生活習慣の改善を検討してください。')}
+        </div>
+    </div>
+    """
 
 def validate_measurements(height, weight, age):
     """身長・体重・年齢の妥当性をチェックする関数"""
@@ -227,196 +220,6 @@ def validate_measurements(height, weight, age):
     
     return messages
 
-def calculate_health_risks(bmi, age, gender):
-    """健康リスクを計算する関数"""
-    risks = {
-        "糖尿病": 0.0,
-        "高血圧": 0.0,
-        "心臓病": 0.0
-    }
-    
-    # 基本リスク計算（BMIベース）
-    if bmi < 18.5:  # 低体重
-        base_risks = {"糖尿病": 0.15, "高血圧": 0.1, "心臓病": 0.1}
-    elif bmi < 25:  # 普通体重
-        base_risks = {"糖尿病": 0.1, "高血圧": 0.1, "心臓病": 0.1}
-    elif bmi < 30:  # 肥満（1度）
-        base_risks = {"糖尿病": 0.2, "高血圧": 0.25, "心臓病": 0.2}
-    elif bmi < 35:  # 肥満（2度）
-        base_risks = {"糖尿病": 0.35, "高血圧": 0.4, "心臓病": 0.3}
-    else:  # 肥満（3度以上）
-        base_risks = {"糖尿病": 0.5, "高血圧": 0.6, "心臓病": 0.4}
-
-    # 年齢による調整
-    age_factor = max(0, (age - 30) / 50)  # 30歳を基準として年齢による影響を計算
-    
-    # 性別による調整
-    gender_factors = {
-        "男性": {"糖尿病": 1.1, "高血圧": 1.2, "心臓病": 1.3},
-        "女性": {"糖尿病": 1.0, "高血圧": 1.0, "心臓病": 1.0}
-    }
-
-    # 最終リスク計算
-    for disease in risks:
-        base_risk = base_risks[disease]
-        gender_factor = gender_factors[gender][disease]
-        
-        # リスク計算式の改善
-        risk = base_risk * (1 + age_factor) * gender_factor
-        
-        # リスクの上限設定
-        risks[disease] = min(0.95, risk)
-
-    return risks
-
-def generate_lifestyle_advice(bmi, age, gender):
-    """BMI、年齢、性別に基づいて生活アドバイスを生成する関数"""
-    advice = {
-        "運動": [],
-        "食事": [],
-        "生活習慣": [],
-        "メンタルヘルス": []
-    }
-    
-    # BMIの詳細な区分に基づくアドバイス
-    if bmi < 16.0:  # 重度の低体重
-        advice["運動"].extend([
-            "過度な有酸素運動は控えめにする",
-            "筋力トレーニングを中心に（週2-3回）",
-            "ストレッチで柔軟性を維持",
-            "疲労を感じたらすぐに休憩を取る"
-        ])
-        advice["食事"].extend([
-            "1日6回程度の少量頻回食",
-            "良質なタンパク質を毎食摂取（肉、魚、卵、大豆製品）",
-            "健康的な脂質を積極的に摂取（ナッツ類、アボカド、オリーブオイル）",
-            "消化の良い炭水化物を選ぶ（白米、パン、パスタなど）"
-        ])
-        advice["生活習慣"].extend([
-            "毎日の体重記録",
-            "十分な睡眠時間の確保（最低7-8時間）",
-            "定期的な医師の診察を受ける",
-            "過度な運動や活動を避ける"
-        ])
-        advice["メンタルヘルス"].extend([
-            "無理なダイエットは避ける",
-            "体重増加のストレスを抱え込まない",
-            "必要に応じて専門家に相談"
-        ])
-    
-    elif bmi < 18.5:  # 低体重
-        advice["運動"].extend([
-            "適度な筋力トレーニング（週2-3回）",
-            "軽い有酸素運動（ウォーキング等）",
-            "ヨガや軽いストレッチ"
-        ])
-        advice["食事"].extend([
-            "1日3食＋間食2回の規則正しい食事",
-            "タンパク質を意識的に摂取",
-            "栄養バランスの良い食事を心がける",
-            "カロリー計算アプリの活用"
-        ])
-        advice["生活習慣"].extend([
-            "規則正しい生活リズム",
-            "定期的な体重管理",
-            "適度な休息を取る"
-        ])
-        advice["メンタルヘルス"].extend([
-            "健康的な体重管理を意識する",
-            "周囲のサポートを受け入れる"
-        ])
-    
-    elif bmi < 25:  # 普通体重
-        advice["運動"].extend([
-            "定期的な有酸素運動（週3-4回）",
-            "筋力トレーニング（週2-3回）",
-            "ストレッチや柔軟体操",
-            "好きなスポーツを楽しむ"
-        ])
-        advice["食事"].extend([
-            "バランスの良い食事",
-            "適切な食事量の維持",
-            "野菜を十分に摂取",
-            "水分を十分に摂取"
-        ])
-        advice["生活習慣"].extend([
-            "規則正しい生活リズムの維持",
-            "定期的な健康診断",
-            "適度な運動習慣の継続"
-        ])
-        advice["メンタルヘルス"].extend([
-            "ストレス解消法を見つける",
-            "趣味や運動で気分転換"
-        ])
-    
-    elif bmi < 30:  # 肥満（1度）
-        advice["運動"].extend([
-            "有酸素運動を中心に（週4-5回）",
-            "筋力トレーニングの併用",
-            "ウォーキングから始める",
-            "徐々に運動強度を上げる"
-        ])
-        advice["食事"].extend([
-            "食事量の適正化",
-            "糖質の摂取を控えめに",
-            "野菜を先に食べる",
-            "間食を控える",
-            "食事記録をつける"
-        ])
-        advice["生活習慣"].extend([
-            "毎日の体重記録",
-            "階段を使う",
-            "こまめに体を動かす"
-        ])
-        advice["メンタルヘルス"].extend([
-            "無理のない目標設定",
-            "小さな成功を褒める",
-            "継続的な取り組みを心がける"
-        ])
-    
-    else:  # 肥満（2度以上）
-        advice["運動"].extend([
-            "医師に相談の上で運動を開始",
-            "低強度の有酸素運動から始める",
-            "水中運動の検討",
-            "徐々に運動時間を延ばす"
-        ])
-        advice["食事"].extend([
-            "栄養士への相談",
-            "食事内容の記録",
-            "食べる速度を遅くする",
-            "野菜を多く摂取",
-            "糖質・脂質の制限"
-        ])
-        advice["生活習慣"].extend([
-            "定期的な医師の診察",
-            "毎日の体重・体調記録",
-            "生活リズムの改善"
-        ])
-        advice["メンタルヘルス"].extend([
-            "専門家のサポートを受ける",
-            "家族や友人のサポートを得る",
-            "焦らず着実に改善を目指す"
-        ])
-    
-    # 年齢による調整
-    if age > 65:
-        advice["運動"] = [adv.replace("強度", "負荷の軽い") for adv in advice["運動"]]
-        advice["運動"].append("関節に優しい運動を選ぶ")
-        advice["生活習慣"].append("転倒予防に注意する")
-    elif age < 25:
-        advice["運動"].append("成長期に合わせた適度な運動")
-        advice["食事"].append("成長に必要な栄養素の摂取")
-    
-    # 性別による調整
-    if gender == "女性":
-        advice["食事"].append("鉄分・カルシウムを意識的に摂取")
-        advice["生活習慣"].append("月経周期に合わせた体調管理")
-    else:
-        advice["食事"].append("適切なタンパク質摂取を心がける")
-    
-    return advice
-
 # アプリケーションの初期化
 init_user_data()
 
@@ -575,6 +378,8 @@ def main():
         st.session_state.calculated = False
     if 'gender' not in st.session_state:
         st.session_state.gender = DEFAULT_VALUES['gender']
+    if 'history_records' not in st.session_state:
+        reset_history_view()
 
     # アプリケーションのタイトル
     st.markdown('<h1 class="title">🏥 健康データ分析・BMI予測</h1>', unsafe_allow_html=True)
@@ -638,10 +443,15 @@ def main():
             if st.button("ログアウト", type="secondary"):
                 st.session_state.logged_in = False
                 st.session_state.username = None
+                reset_history_view()
                 st.rerun()
 
         # メインのタブ
-        tab1, tab2 = st.tabs(["📊 診断", "📋 履歴"])
+        tab_labels = ["📊 診断", "📋 履歴"]
+        admin = is_admin(st.session_state.username)
+        if admin:
+            tab_labels.append("⏱ レイテンシ")
+        tab1, tab2, *admin_tabs = st.tabs(tab_labels)
 
         with tab1:
             # 入力フォームと結果表示のレイアウト
@@ -746,6 +556,8 @@ def main():
 
             # 計算ボタンが押されたらセッションステートを更新
             if calculate_button:
+                latency = get_latency_metrics()
+                diagnosis_started = time.perf_counter()
                 st.session_state.calculated = True
                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
                 
@@ -753,25 +565,53 @@ def main():
                 bmi = weight / ((height/100) ** 2)
                 
                 # 入力値の妥当性チェック
-                validation_messages = validate_measurements(height, weight, age)
+                with latency.span("validation"):
+                    validation_messages = validate_measurements(height, weight, age)
                 if validation_messages:
                     for msg in validation_messages:
                         st.warning(msg)
-                        # 1. モデルを読み込む
-                        model = joblib.load("model.pkl")  # または糖尿病_model.joblibなど
 
-                        # 2. 入力をAIに渡す
-                        X_input = [[height, weight, age]]
-                        risk_pred = model.predict(X_input)[0]
-
-                        # 3. 結果を表示する
-                        if risk_pred == 1:
-                            st.warning("あなたは健康リスクがある可能性があります")
-                        else:
-                            st.success("現在のところ健康リスクは低いです")
+                    # 1. モデルを取得する（プロセス内で共有し、更新時のみ再読み込み）
+                    with latency.span("model_load"):
+                        registry = get_model_registry()
+                        model = registry.get_legacy_model()
+
+                    # 2. 入力をAIに渡す
+                    X_input = [[height, weight, age]]
+                    started = time.perf_counter()
+                    probabilities = model.predict_proba(X_input)[0]
+                    risk_pred = model.classes_[probabilities.argmax()]
+                    latency.observe("model_predict", time.perf_counter() - started)
+                    get_prediction_logger().log(make_prediction_record(
+                        model="model.pkl",
+                        model_version=registry.version(registry.legacy_model_path),
+                        inputs={"height": height, "weight": weight, "age": age},
+                        probabilities={str(c): float(p) for c, p in zip(model.classes_, probabilities)},
+                        latency_ms=(time.perf_counter() - started) * 1000,
+                        prediction=int(risk_pred),
+                    ))
+
+                    # 3. 結果を表示する
+                    if risk_pred == 1:
+                        st.warning("あなたは健康リスクがある可能性があります")
+                    else:
+                        st.success("現在のところ健康リスクは低いです")
                 
                 # BMI判定
-                status, color, bg_color, advice = calculate_bmi_status(bmi, age, gender)
+                with latency.span("bmi_status"):
+                    status, color, bg_color, advice = calculate_bmi_status(bmi, age, gender)
+
+                # 疾病ごとのリスクを予測ログに記録する（書き込みはバックグラウンドで行う）
+                started = time.perf_counter()
+                risks = calculate_health_risks(bmi, age, gender)
+                latency.observe("health_risks", time.perf_counter() - started)
+                get_prediction_logger().log(make_prediction_record(
+                    model="health_risks",
+                    model_version=None,
+                    inputs={"height": height, "weight": weight, "age": age, "gender": gender, "bmi": bmi},
+                    probabilities={disease: float(risk) for disease, risk in risks.items()},
+                    latency_ms=(time.perf_counter() - started) * 1000,
+                ))
                 
                 # 診断結果を作成
                 result = {
@@ -788,7 +628,10 @@ def main():
                 }
 
                 # ユーザーの履歴に保存
-                save_user_history(st.session_state.username, result)
+                with latency.span("history_save"):
+                    save_user_history(st.session_state.username, result)
+                reset_history_view()
+                latency.observe("diagnosis_total", time.perf_counter() - diagnosis_started)
                 
                 st.rerun()
 
@@ -892,7 +735,8 @@ def main():
                     st.markdown('<div class="risk-section" style="margin-top: 2rem;">', unsafe_allow_html=True)
                     st.markdown('<div class="risk-title">💡 生活アドバイス</div>', unsafe_allow_html=True)
                     
-                    advice = generate_lifestyle_advice(bmi, age, gender)
+                    with get_latency_metrics().span("lifestyle_advice"):
+                        advice = generate_lifestyle_advice(bmi, age, gender)
                     
                     # アドバイスの表示を4列に分ける
                     advice_cols = st.columns(4)
@@ -934,7 +778,8 @@ def main():
                         # データ分析の表示
                         if processor.data is not None:
                             # 基本統計情報
-                            stats = processor.generate_health_statistics()
+                            with get_latency_metrics().span("health_statistics"):
+                                stats = processor.generate_health_statistics()
                             stat_col1, stat_col2, stat_col3 = st.columns(3)
                             with stat_col1:
                                 st.metric("全体のBMI平均", f"{stats['全体']['BMI平均']:.2f}")
@@ -943,14 +788,22 @@ def main():
                             with stat_col3:
                                 st.metric("データ数", f"{len(processor.data):,}")
 
+                            # グラフ用の集計済みデータ（全データ点は送らない）
+                            with get_latency_metrics().span("chart_data"):
+                                chart_data = processor.generate_chart_data()
+
                             # BMI分布のグラフ
                             st.subheader("BMIの分布")
-                            fig_bmi = px.histogram(
-                                processor.data,
-                                x="BMI",
-                                nbins=30,
-                                title="BMIの分布"
+                            histogram = chart_data["histogram"]
+                            fig_bmi = go.Figure(
+                                go.Bar(
+                                    x=histogram["中央"],
+                                    y=histogram["件数"],
+                                    width=histogram["終了"] - histogram["開始"],
+                                    name="件数"
+                                )
                             )
+                            fig_bmi.update_layout(title="BMIの分布", xaxis_title="BMI", yaxis_title="件数", bargap=0)
                             # 現在のBMIを示す垂直線を追加
                             fig_bmi.add_vline(
                                 x=bmi,
@@ -963,12 +816,19 @@ def main():
 
                             # 性別ごとのBMI分布
                             st.subheader("性別ごとのBMI分布")
-                            fig_gender = px.box(
-                                processor.data,
-                                x="性別",
-                                y="BMI",
-                                title="性別ごとのBMI分布"
+                            box = chart_data["box"]
+                            fig_gender = go.Figure(
+                                go.Box(
+                                    x=list(box.index),
+                                    q1=box["q1"],
+                                    median=box["median"],
+                                    q3=box["q3"],
+                                    lowerfence=box["lowerfence"],
+                                    upperfence=box["upperfence"],
+                                    name="BMI"
+                                )
                             )
+                            fig_gender.update_layout(title="性別ごとのBMI分布", xaxis_title="性別", yaxis_title="BMI")
                             # 現在のBMIを示す水平線を追加
                             fig_gender.add_hline(
                                 y=bmi,
@@ -981,13 +841,16 @@ def main():
 
                             # 年齢とBMIの関係
                             st.subheader("年齢とBMIの関係")
+                            scatter = chart_data["scatter"]
                             fig_age_bmi = px.scatter(
-                                processor.data,
+                                scatter,
                                 x="年齢",
                                 y="BMI",
                                 color="性別",
                                 title="年齢とBMIの関係"
                             )
+                            if len(scatter) < len(processor.data):
+                                st.caption(f"表示点数: {len(scatter):,} / {len(processor.data):,}（密度に応じて間引いています）")
                             # 現在の位置をプロット
                             fig_age_bmi.add_trace(
                                 go.Scatter(
@@ -1012,37 +875,36 @@ def main():
 
         # 履歴タブ
         with tab2:
-            # ユーザーの履歴を読み込む
-            history = load_user_history(st.session_state.username)
-            
+            # 表示中のページだけを読み込み、続きは「さらに読み込む」で取得する
+            if st.session_state.history_records is None:
+                records, cursor = load_user_history_page(st.session_state.username)
+                st.session_state.history_records = records
+                st.session_state.history_cursor = cursor
+
+            history = st.session_state.history_records
+
             if not history:
                 st.info("まだ診断履歴がありません。")
             else:
-                # 履歴を新しい順に表示
-                for result in reversed(history):
-                    with st.container():
-                        st.markdown(f"""
-                        <div class="history-card">
-                            <div class="history-date">{result['datetime']}</div>
-                            <div style="display: flex; justify-content: space-between; margin-bottom: 1rem;">
-                                <div>性別: {result['gender']}</div>
-                                <div>年齢: {result['age']}歳</div>
-                                <div>身長: {result['height']:.1f}cm</div>
-                                <div>体重: {result['weight']:.1f}kg</div>
-                            </div>
-                            <div style="display: flex; align-items: center; margin-bottom: 1rem;">
-                                <div style="font-size: 1.2rem; margin-right: 1rem;">
-                                    BMI: <strong>{result['bmi']:.1f}</strong>
-                                </div>
-                                <div style="font-size: 1.2rem;">
-                                    判定: <strong>{result['color']} {result['status']}</strong>
-                                </div>
-                            </div>
-                            <div style="color: #666; font-style: italic;">
-                                {result.get('advice', '判定結果に基づいて生活習慣の改善を検討してください。')}
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                # 履歴を新しい順に、ページ単位でまとめて表示
+                for start in range(0, len(history), HISTORY_PAGE_SIZE):
+                    page = history[start:start + HISTORY_PAGE_SIZE]
+                    st.markdown("".join(render_history_card(result) for result in page), unsafe_allow_html=True)
+
+                if st.session_state.history_cursor is not None:
+                    if st.button("さらに読み込む", use_container_width=True):
+                        records, cursor = load_user_history_page(
+                            st.session_state.username,
+                            cursor=st.session_state.history_cursor
+                        )
+                        st.session_state.history_records.extend(records)
+                        st.session_state.history_cursor = cursor
+                        st.rerun()
+
+        if admin:
+            with admin_tabs[0]:
+                st.header("⏱ 処理段階ごとのレイテンシ")
+                render_latency_metrics()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
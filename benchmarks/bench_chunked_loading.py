@@ -0,0 +1,66 @@
+# benchmarks/bench_chunked_loading.py
+"""load_and_process_data と load_and_process_data_chunks の予測結果・速度・メモリの比較
+
+チャンク単位で読み込んだ特徴量で予測した確率が、一括で読み込んだ場合と一致することを確認してから、
+読み込みと予測にかかる時間と、特徴量のDataFrameのメモリ使用量を表示する。
+
+実行方法（リポジトリのルートで。事前に python data_processor.py でモデルの学習が必要）:
+    python -m benchmarks.bench_chunked_loading
+    python -m benchmarks.bench_chunked_loading --data data/raw/medical_data.csv --chunksize 1000
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from data_processor import iter_predict_risks, load_and_process_data, load_and_process_data_chunks, predict_risks_batch
+from model_registry import ModelRegistry
+
+
+def predict_all_at_once(models, scaler, path):
+    X, _ = load_and_process_data(path)
+    return predict_risks_batch(models, scaler, X), X.memory_usage(deep=True).sum()
+
+
+def predict_by_chunks(models, scaler, path, chunksize):
+    chunk_bytes = 0
+    frames = []
+    for X, _ in load_and_process_data_chunks(path, chunksize=chunksize):
+        chunk_bytes = max(chunk_bytes, X.memory_usage(deep=True).sum())
+        frames.extend(iter_predict_risks(models, scaler, [X]))
+    return pd.concat(frames, ignore_index=True), chunk_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/raw/medical_data.csv")
+    parser.add_argument("--chunksize", type=int, default=1000)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # 学習時と異なるsklearnのバージョンの警告
+        models, scaler = ModelRegistry(measure_memory=False).get_disease_models()
+
+    start = time.perf_counter()
+    expected, all_bytes = predict_all_at_once(models, scaler, args.data)
+    all_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual, chunk_bytes = predict_by_chunks(models, scaler, args.data, args.chunksize)
+    chunk_seconds = time.perf_counter() - start
+
+    expected = expected.reset_index(drop=True)
+    differences = (expected - actual).abs()
+    print(f"予測確率の差の最大値（{len(expected):,}行）: {differences.to_numpy().max():.3g}")
+    print(f"予測確率が異なる行数: {(differences > 0).sum().to_dict()}")
+    if not np.array_equal(expected.to_numpy(), actual.to_numpy()):
+        raise SystemExit("チャンク単位の読み込みで予測確率が変わりました")
+
+    print(f"{'読み込み方法':<12} {'時間[s]':>8} {'特徴量のメモリ[KB]':>18}")
+    print(f"{'一括':<12} {all_seconds:>8.2f} {all_bytes / 1024:>18,.0f}")
+    print(f"{'チャンク':<12} {chunk_seconds:>8.2f} {chunk_bytes / 1024:>18,.0f}（1チャンクの最大）")
+
+
+if __name__ == "__main__":
+    main()
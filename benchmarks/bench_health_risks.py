@@ -0,0 +1,104 @@
+# benchmarks/bench_health_risks.py
+"""calculate_health_risks（スカラー版）と calculate_health_risks_batch の速度比較
+
+実行方法（リポジトリのルートで）:
+    python -m benchmarks.bench_health_risks
+    python -m benchmarks.bench_health_risks --sizes 10000 1000000 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from health_assessment import DISEASES, calculate_health_risks, calculate_health_risks_batch
+
+
+def make_cohort(n, seed=42):
+    """ベンチマーク用のBMI・年齢・性別の配列を生成する関数"""
+    rng = np.random.default_rng(seed)
+    bmi = rng.normal(23, 4, n)
+    age = rng.integers(20, 90, n)
+    gender = rng.choice(np.array(["男性", "女性"]), n)
+    return bmi, age, gender
+
+
+def _scalar_or_error(bmi, age, gender):
+    try:
+        return [calculate_health_risks(b, a, g) for b, a, g in zip(bmi, age, gender)]
+    except KeyError:
+        return KeyError
+
+
+def _batch_or_error(bmi, age, gender):
+    try:
+        risks = calculate_health_risks_batch(bmi, age, gender)
+    except KeyError:
+        return KeyError
+    return [dict(zip(DISEASES, row)) for row in risks.tolist()]
+
+
+def check_equivalence(n=10_000, seed=0):
+    """スカラー版とバッチ版（文字列の配列・カテゴリ型）の結果が一致するか確認する関数
+
+    欠損値（カテゴリ型では番号 -1）や未対応の性別は、どちらも KeyError になることを確認する。
+    """
+    bmi, age, gender = make_cohort(n, seed)
+    bmi[:4] = [np.nan, 18.5, 25, 35]
+    cases = {
+        "通常": (bmi, age, gender),
+        "欠損値の性別": (bmi[:3], age[:3], np.array(["男性", None, "女性"], dtype=object)),
+        "未対応の性別": (bmi[:3], age[:3], np.array(["男性", "M", "女性"], dtype=object)),
+    }
+    for name, (b, a, g) in cases.items():
+        expected = _scalar_or_error(b.tolist(), a.tolist(), g.tolist())
+        categorical = pd.Series(g, dtype="category")
+        for label, gender_input in [("配列", g), ("カテゴリ型", categorical)]:
+            actual = _batch_or_error(b, a, gender_input)
+            if actual != expected:
+                raise AssertionError(f"スカラー版とバッチ版の結果が一致しません: {name}（{label}）")
+    print(f"スカラー版とバッチ版の一致を確認しました（{n:,}行と欠損値・未対応の性別）")
+
+
+def time_scalar(bmi, age, gender):
+    """スカラー版を1行ずつ呼び出した時間を計測する関数"""
+    start = time.perf_counter()
+    for b, a, g in zip(bmi.tolist(), age.tolist(), gender.tolist()):
+        calculate_health_risks(b, a, g)
+    return time.perf_counter() - start
+
+
+def time_batch(bmi, age, gender, repeat=3):
+    """バッチ版の最短実行時間を計測する関数"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calculate_health_risks_batch(bmi, age, gender)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument(
+        "--scalar-limit", type=int, default=200_000,
+        help="スカラー版を実測する最大行数（超える場合は実測値から線形に推定）",
+    )
+    args = parser.parse_args()
+
+    check_equivalence()
+    print(f"{'行数':>12} {'スカラー版[s]':>14} {'バッチ版[s]':>12} {'高速化':>10}")
+    for n in args.sizes:
+        bmi, age, gender = make_cohort(n)
+
+        measured = min(n, args.scalar_limit)
+        scalar = time_scalar(bmi[:measured], age[:measured], gender[:measured]) * n / measured
+        batch = time_batch(bmi, age, gender)
+
+        note = "" if measured == n else " (推定)"
+        print(f"{n:>12,} {scalar:>14.3f} {batch:>12.4f} {scalar / batch:>9.0f}x{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_model_loading.py
+"""モデルの読み込み方法ごとの起動時間とメモリ使用量の比較
+
+joblib（sklearnのモデル）と、メモリマップで読み込むバンドル（model_bundle.py）のそれぞれについて、
+新しいプロセスで（ライブラリのimport後に）読み込み、1行を予測するまでの時間と、
+増えた非共有メモリ（/proc/self/smaps_rollup の Anonymous。Linuxのみ）を計測する。
+バンドルの配列はページキャッシュ上で共有されるため、プロセス数が増えても物理メモリは増えにくい。
+
+実行方法（リポジトリのルートで。事前に python model_bundle.py build が必要）:
+    python -m benchmarks.bench_model_loading
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time, warnings
+warnings.simplefilter("ignore")
+import numpy as np
+import pandas as pd
+from data_processor import FEATURES, predict_risks
+from model_bundle import load_bundle
+from model_registry import ModelRegistry
+
+
+def anonymous_mb():
+    # 共有できない（ファイルに対応しない）メモリ量。メモリマップしたファイルのページは含まれない
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1]) / 1024
+
+
+row = np.array([[45, 1, 24.9, 130, 85, 2, 0, 1, 6.5]])
+baseline = anonymous_mb()
+start = time.perf_counter()
+if sys.argv[1] == "joblib":
+    models, scaler = ModelRegistry(measure_memory=False).get_disease_models()
+    loaded = time.perf_counter()
+    predict_risks(models, scaler, pd.DataFrame(row, columns=FEATURES))
+else:
+    compiled, _ = load_bundle()
+    loaded = time.perf_counter()
+    compiled.predict_risks(row)
+end = time.perf_counter()
+print(json.dumps({
+    "load": loaded - start,
+    "first_prediction": end - loaded,
+    "private_mb": anonymous_mb() - baseline,
+}))
+"""
+
+
+def measure(kind):
+    """新しいプロセスで kind の方法でモデルを読み込み、計測結果を返す"""
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, kind], cwd=BASE_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'形式':<8} {'読み込み[ms]':>12} {'初回予測[ms]':>12} {'非共有メモリ[MB]':>12}")
+    for kind in ("joblib", "bundle"):
+        results = [measure(kind) for _ in range(args.repeat)]
+        best = min(results, key=lambda r: r["load"])
+        print(f"{kind:<8} {best['load'] * 1000:>12.1f} {best['first_prediction'] * 1000:>12.2f} {best['private_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
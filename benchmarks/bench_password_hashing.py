@@ -0,0 +1,50 @@
+# benchmarks/bench_password_hashing.py
+"""scryptのコストごとのログイン処理性能（1秒あたりのログイン数と待ち時間）
+
+同時に concurrency 件のログインを発生させ、パスワード処理用のスレッドプールを通して検証時間を計測する。
+
+実行方法（リポジトリのルートで）:
+    python -m benchmarks.bench_password_hashing
+    python -m benchmarks.bench_password_hashing --costs 12 14 16 --concurrency 16
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from password_hashing import PASSWORD_HASH_WORKERS, get_password_executor, hash_password, verify_password
+
+
+def run_logins(stored, logins, concurrency):
+    """concurrency 件ずつ同時にログインし、全体の時間と各ログインの待ち時間を返す関数"""
+    def login(_):
+        start = time.perf_counter()
+        assert get_password_executor().submit(verify_password, "password123", stored).result()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        latencies = list(clients.map(login, range(logins)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 12, 14, 15, 16])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"検証スレッド数: {PASSWORD_HASH_WORKERS}, 同時ログイン数: {args.concurrency}")
+    print(f"{'コスト(log2 N)':>14} {'ログイン/秒':>12} {'p50[ms]':>10} {'p95[ms]':>10}")
+    for cost in args.costs:
+        stored = hash_password("password123", cost=cost)
+        elapsed, latencies = run_logins(stored, args.logins, args.concurrency)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+        print(f"{cost:>14} {args.logins / elapsed:>12.1f} {p50:>10.1f} {p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
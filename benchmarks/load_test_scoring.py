@@ -0,0 +1,140 @@
+# benchmarks/load_test_scoring.py
+"""予測サービス（scoring_service.py）の負荷試験
+
+バッチ待ち時間ごとにサービスを別プロセスで起動し、concurrency 本の接続（keep-alive）から
+合計 requests 件のリクエストを送って、スループットと待ち時間（p50/p95/p99）を比較する。
+
+実行方法（リポジトリのルートで）:
+    python -m benchmarks.load_test_scoring
+    python -m benchmarks.load_test_scoring --windows 0 1 2 5 10 --concurrency 64 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_payloads(n, seed=0):
+    """リクエストの本文を n 件生成する関数"""
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for _ in range(n):
+        payloads.append(json.dumps({
+            "年齢": int(rng.integers(20, 80)),
+            "性別": str(rng.choice(["男性", "女性"])),
+            "身長": float(rng.normal(165, 10)),
+            "体重": float(rng.normal(60, 12)),
+            "血圧_最高": float(rng.normal(120, 15)),
+            "血圧_最低": float(rng.normal(80, 10)),
+            "運動頻度": int(rng.integers(0, 8)),
+            "喫煙": int(rng.integers(0, 2)),
+            "飲酒": int(rng.integers(0, 2)),
+            "睡眠時間": float(rng.normal(7, 1)),
+        }, ensure_ascii=False).encode("utf-8"))
+    return payloads
+
+
+async def request(reader, writer, method, path, body=b""):
+    """keep-aliveの接続で1件リクエストを送り、(ステータス, 本文) を返す"""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def run_load(port, payloads, concurrency):
+    """concurrency 本の接続から payloads を送り、全体の時間と各リクエストの待ち時間を返す"""
+    queue = list(reversed(payloads))
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while queue:
+                body = queue.pop()
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, "POST", "/predict", body)
+                latencies.append(time.perf_counter() - start)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+async def fetch_stats(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        _, body = await request(reader, writer, "GET", "/stats")
+        return json.loads(body)
+    finally:
+        writer.close()
+
+
+def start_service(port, window_ms, max_batch_size):
+    """サービスを別プロセスで起動し、待ち受けを始めるまで待つ関数"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "scoring_service.py"), "--port", str(port),
+         "--batch-window-ms", str(window_ms), "--max-batch-size", str(max_batch_size)],
+        cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    process.stdout.readline()  # 「待ち受けています」の行
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10], help="バッチ待ち時間（ミリ秒）")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.requests)
+    print(f"同時接続数: {args.concurrency}, リクエスト数: {args.requests}")
+    print(f"{'待ち時間[ms]':>12} {'件/秒':>10} {'平均バッチ':>10} {'p50[ms]':>9} {'p95[ms]':>9} {'p99[ms]':>9} {'エラー':>6}")
+    for window in args.windows:
+        process = start_service(args.port, window, args.max_batch_size)
+        try:
+            # 接続の確立やモデルの初回呼び出しを計測に含めないよう、少し送ってから計測する
+            asyncio.run(run_load(args.port, payloads[:args.concurrency], args.concurrency))
+            before = asyncio.run(fetch_stats(args.port))
+            elapsed, latencies, errors = asyncio.run(run_load(args.port, payloads, args.concurrency))
+            after = asyncio.run(fetch_stats(args.port))
+        finally:
+            process.terminate()
+            process.wait()
+
+        batches = after["batches"] - before["batches"]
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        print(
+            f"{window:>12g} {len(latencies) / elapsed:>10,.0f} {(after['rows'] - before['rows']) / max(batches, 1):>10.1f} "
+            f"{p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {errors:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/run.py
+"""ベンチマークを実行し、結果をJSONに保存・比較するランナー
+
+結果は benchmarks/results/<コミット>.json に保存する。--compare に以前の結果を渡すと、
+最短時間が --threshold（既定20%）を超えて遅くなったベンチマークを表示し、終了コード1で終わる。
+
+実行方法（リポジトリのルートで）:
+    python -m benchmarks.run
+    python -m benchmarks.run --filter health. history.
+    python -m benchmarks.run --compare benchmarks/results/<基準のコミット>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.suite import BENCHMARKS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_THRESHOLD = 0.20
+# 1サンプルあたりの最短計測時間（これより短い関数は複数回呼び出してまとめて計測する）
+MIN_SAMPLE_TIME = 0.05
+
+
+def git_commit():
+    """現在のコミットのハッシュ（未コミットの変更があれば末尾に -dirty）を返す関数"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def measure(func, repeat=5, min_sample_time=MIN_SAMPLE_TIME):
+    """func の1回あたりの実行時間（秒）を repeat 個のサンプルで計測する関数"""
+    # 1サンプルが min_sample_time 以上になる呼び出し回数を決める
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample_time:
+            break
+        number *= 10 if elapsed < min_sample_time / 10 else 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(names, repeat=5):
+    """指定したベンチマークを実行し、名前をキーにした結果を返す関数"""
+    results = {}
+    for name in names:
+        # 学習時のレポートなど、計測対象の関数の出力は表示しない
+        with contextlib.redirect_stdout(io.StringIO()):
+            func = BENCHMARKS[name]()
+            result = measure(func, repeat=repeat)
+        results[name] = result
+        print(f"{name:<55} {result['median'] * 1000:>12.3f} ms  (min {result['min'] * 1000:.3f} ms, ×{result['number']})")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """基準の結果と比べて、最短時間が threshold を超えて遅くなったベンチマークを返す関数
+
+    他の処理の割り込みによる揺らぎを受けにくいよう、中央値ではなく最短時間で比べる。
+    """
+    regressions = []
+    print(f"\n{'ベンチマーク':<55} {'基準[ms]':>12} {'今回[ms]':>12} {'変化':>8}")
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["min"] / base["min"] - 1
+        mark = " ← 悪化" if ratio > threshold else ""
+        print(f"{name:<55} {base['min'] * 1000:>12.3f} {result['min'] * 1000:>12.3f} {ratio:>+7.1%}{mark}")
+        if ratio > threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", nargs="+", default=None, help="名前がいずれかで始まるベンチマークだけを実行")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="結果の保存先（既定は benchmarks/results/<コミット>.json）")
+    parser.add_argument("--compare", default=None, help="比較する基準の結果JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="悪化とみなす最短時間の増加率")
+    parser.add_argument("--list", action="store_true", help="ベンチマークの一覧を表示して終了")
+    args = parser.parse_args()
+
+    names = [
+        name for name in BENCHMARKS
+        if args.filter is None or name.startswith(tuple(args.filter))
+    ]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    commit = git_commit()
+    results = run_benchmarks(names, repeat=args.repeat)
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)}件のベンチマークが {args.threshold:.0%} を超えて遅くなりました。")
+            return 1
+        print("\n性能の悪化はありません。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
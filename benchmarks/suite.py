@@ -0,0 +1,171 @@
+# benchmarks/suite.py
+"""ベンチマークの定義
+
+各ベンチマークは「準備処理を行い、計測対象の関数（引数なし）を返す関数」として登録する。
+準備処理の時間は計測に含まれない。計測と結果の保存は benchmarks.run が行う。
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from data_processor import FEATURES, TARGETS, generate_sample_medical_data, predict_risks, train_models
+from forest_export import CompiledRiskModels
+from health_assessment import calculate_bmi_status, calculate_health_risks
+from history_store import HistoryStore
+from lifestyle_advice import generate_lifestyle_advice
+from mhlw_data_processor import MHLWDataProcessor
+
+# 1回の呼び出しで処理する入力の件数（関数1回あたりの時間が短すぎると計測誤差が大きいため）
+INPUTS_PER_CALL = 1000
+HISTORY_SIZES = (100, 1_000, 10_000)
+STATISTICS_SIZES = (1_000, 100_000)
+TRAINING_SAMPLES = 2_000
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """ベンチマークを登録するデコレーター"""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def make_inputs(n=INPUTS_PER_CALL, seed=42):
+    """BMI・年齢・性別の入力を n 件生成する関数"""
+    rng = np.random.default_rng(seed)
+    bmi = rng.normal(23, 4, n).tolist()
+    age = rng.integers(10, 90, n).tolist()
+    gender = rng.choice(["男性", "女性"], n).tolist()
+    return list(zip(bmi, age, gender))
+
+
+def make_history_record(i):
+    """診断履歴1件分のデータを作る関数"""
+    return {
+        "datetime": f"2024-01-01 00:{i % 60:02d}",
+        "gender": "男性",
+        "age": 30,
+        "height": 170.0,
+        "weight": 60.0 + i % 10,
+        "bmi": 21.0,
+        "status": "普通体重",
+        "color": "🟢",
+        "bg_color": "#E8F5E9",
+        "advice": "健康的な体重を維持しましょう",
+    }
+
+
+@benchmark("health.calculate_bmi_status")
+def bench_calculate_bmi_status():
+    inputs = make_inputs()
+
+    def run():
+        for bmi, age, gender in inputs:
+            calculate_bmi_status(bmi, age, gender)
+    return run
+
+
+@benchmark("health.calculate_health_risks")
+def bench_calculate_health_risks():
+    inputs = make_inputs()
+
+    def run():
+        for bmi, age, gender in inputs:
+            calculate_health_risks(bmi, age, gender)
+    return run
+
+
+@benchmark("advice.generate_lifestyle_advice")
+def bench_generate_lifestyle_advice():
+    inputs = make_inputs()
+
+    def run():
+        for bmi, age, gender in inputs:
+            generate_lifestyle_advice(bmi, age, gender)
+    return run
+
+
+def _history_store(size):
+    """一時ディレクトリに size 件の履歴を持つ履歴ストアを作る関数"""
+    directory = tempfile.mkdtemp(prefix="bench-history-")
+    atexit.register(shutil.rmtree, directory, True)
+    store = HistoryStore(os.path.join(directory, "history.sqlite3"))
+    store.append_many("bench", [make_history_record(i) for i in range(size)])
+    return store
+
+
+def _register_history_benchmarks(size):
+    @benchmark(f"history.save[{size}]")
+    def bench_save():
+        store = _history_store(size)
+        record = make_history_record(size)
+        return lambda: store.append("bench", record)
+
+    @benchmark(f"history.load[{size}]")
+    def bench_load():
+        store = _history_store(size)
+        return lambda: store.load("bench")
+
+    @benchmark(f"history.page[{size}]")
+    def bench_page():
+        store = _history_store(size)
+        return lambda: store.page("bench")
+
+
+for _size in HISTORY_SIZES:
+    _register_history_benchmarks(_size)
+
+
+def _register_statistics_benchmarks(n_samples):
+    @benchmark(f"statistics.generate_health_statistics[{n_samples}]")
+    def bench_statistics():
+        processor = MHLWDataProcessor()
+        processor.load_sample_data(n_samples=n_samples)
+        # キャッシュを使わず毎回集計する
+        processor.cache_key = None
+        return processor.generate_health_statistics
+
+    @benchmark(f"statistics.generate_health_statistics_cached[{n_samples}]")
+    def bench_statistics_cached():
+        processor = MHLWDataProcessor()
+        processor.load_sample_data(n_samples=n_samples)
+        processor.generate_health_statistics()
+        return processor.generate_health_statistics
+
+
+for _size in STATISTICS_SIZES:
+    _register_statistics_benchmarks(_size)
+
+
+def _training_data(n_samples=TRAINING_SAMPLES):
+    data = generate_sample_medical_data(n_samples)
+    data["性別"] = (data["性別"] == "男性").astype(int)
+    return data[FEATURES], data[TARGETS]
+
+
+@benchmark("training.train_models")
+def bench_train_models():
+    X, y = _training_data()
+    return lambda: train_models(X, y, max_workers=1)
+
+
+@benchmark("training.predict_risks")
+def bench_predict_risks():
+    X, y = _training_data()
+    models, scaler = train_models(X, y, max_workers=1)
+    sample = X.iloc[[0]]
+    return lambda: predict_risks(models, scaler, sample)
+
+
+@benchmark("training.predict_risks_compiled")
+def bench_predict_risks_compiled():
+    X, y = _training_data()
+    models, scaler = train_models(X, y, max_workers=1)
+    compiled = CompiledRiskModels.from_sklearn(models, scaler)
+    sample = X.iloc[[0]]
+    return lambda: compiled.predict_risks(sample)
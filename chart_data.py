@@ -0,0 +1,96 @@
+# chart_data.py
+import numpy as np
+import pandas as pd
+
+# 散布図に描画する最大点数
+MAX_SCATTER_POINTS = 5000
+
+
+def histogram_summary(values, nbins=30):
+    """ヒストグラムを事前に集計する関数
+
+    ブラウザに全データ点を送らず、ビンごとの件数だけを返す。
+    戻り値は「開始」「終了」「中央」「件数」列を持つDataFrame。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return pd.DataFrame(columns=["開始", "終了", "中央", "件数"])
+
+    counts, edges = np.histogram(values, bins=nbins)
+    return pd.DataFrame({
+        "開始": edges[:-1],
+        "終了": edges[1:],
+        "中央": (edges[:-1] + edges[1:]) / 2,
+        "件数": counts,
+    })
+
+
+def box_summary(data, x, y):
+    """箱ひげ図の統計量（四分位点とひげの端）をグループごとに求める関数
+
+    ひげの端は plotly と同じく、四分位範囲の1.5倍以内にある最小値・最大値とする。
+    戻り値は x の値をインデックスに持ち、q1・median・q3・lowerfence・upperfence・count 列を持つDataFrame。
+    """
+    values = data[[x, y]].dropna()
+    grouped = values.groupby(x, observed=True, sort=False)[y]
+    summary = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    summary.columns = ["q1", "median", "q3"]
+
+    iqr = summary["q3"] - summary["q1"]
+    low_limit = values[x].map(summary["q1"] - 1.5 * iqr)
+    high_limit = values[x].map(summary["q3"] + 1.5 * iqr)
+    summary["lowerfence"] = values[y].where(values[y] >= low_limit).groupby(values[x], observed=True).min()
+    summary["upperfence"] = values[y].where(values[y] <= high_limit).groupby(values[x], observed=True).max()
+    summary["count"] = grouped.size()
+    return summary
+
+
+def _largest_cap(counts, max_points):
+    """各セルから最大 cap 点ずつ残したとき合計が max_points 以下になる最大の cap を求める"""
+    low, high = 1, int(counts.max())
+    while low < high:
+        middle = (low + high + 1) // 2
+        if np.minimum(counts, middle).sum() <= max_points:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def downsample_scatter(data, x, y, max_points=MAX_SCATTER_POINTS, bins=64, seed=0):
+    """散布図用に、点の密度を考慮して最大 max_points 点まで間引く関数
+
+    x・y の範囲を bins×bins のセルに分け、各セルから同じ上限数までを無作為に残す。
+    密集した領域は間引かれ、まばらな領域（外れ値など）の点はそのまま残る。
+    """
+    if len(data) <= max_points:
+        return data
+
+    values = data[[x, y]].to_numpy(dtype=np.float64)
+    finite = np.isfinite(values).all(axis=1)
+    positions = np.flatnonzero(finite)
+    values = values[finite]
+    if len(values) == 0:
+        # 描画できる点が無い（全ての行で x か y が欠損値）
+        return data.iloc[positions]
+
+    # 各点のセル番号
+    cells = np.zeros(len(values), dtype=np.int64)
+    for column in range(2):
+        edges = np.linspace(values[:, column].min(), values[:, column].max(), bins + 1)
+        cells = cells * bins + np.clip(np.searchsorted(edges, values[:, column], side="right") - 1, 0, bins - 1)
+
+    # 無作為な順序で並べ、セル内での順位を求める
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(cells))
+    shuffled_cells = cells[order]
+    sort = np.argsort(shuffled_cells, kind="stable")
+    sorted_cells = shuffled_cells[sort]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_cells)])
+    ranks = np.arange(len(sorted_cells)) - np.repeat(starts, counts)
+
+    cap = _largest_cap(counts, max_points)
+    keep = np.sort(positions[order[sort[ranks < cap]]])
+    return data.iloc[keep]
@@ -0,0 +1,101 @@
+# columnar_cache.py
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrowが無い環境では通常のCSV読み込みにフォールバックする
+    pa = None
+    feather = None
+
+from model_registry import file_sha256
+
+CACHE_DIR_NAME = ".columnar_cache"
+
+
+def source_fingerprint(path, cache_dir):
+    """元ファイルのハッシュを返す関数
+
+    サイズと更新日時が前回と同じなら、記録済みのハッシュを再利用して再計算を省く。
+    """
+    stat = os.stat(path)
+    record_path = os.path.join(cache_dir, os.path.basename(path) + ".source.json")
+    try:
+        with open(record_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        if record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+            return record["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sha256 = file_sha256(path)
+    record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+    tmp_path = record_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(tmp_path, record_path)
+    return sha256
+
+
+def _cache_path(path, cache_dir, sha256, read_csv_kwargs):
+    # 読み込みオプションが違えば結果のDataFrameも違うため、ファイル名に含める。
+    # 元ファイルの内容とオプションは別々の部分にし、古いキャッシュを内容の部分だけで判別できるようにする
+    options = hashlib.sha256(repr(sorted(read_csv_kwargs.items())).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{sha256[:16]}.{options}.feather")
+
+
+def _remove_stale_caches(path, cache_dir, sha256):
+    """元ファイルの内容が変わる前に作られたキャッシュを削除する関数
+
+    同じ内容で読み込みオプションだけが違うキャッシュは残す。
+    """
+    prefix = os.path.basename(path) + "."
+    current = f"{prefix}{sha256[:16]}."
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith(".feather") and not name.startswith(current):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass  # 他のプロセスが先に削除した
+
+
+def read_csv_cached(path, **read_csv_kwargs):
+    """CSVを列指向キャッシュ（Feather）経由で読み込む関数
+
+    元のCSVと同じディレクトリの .columnar_cache/ に、CSVの内容のハッシュと読み込みオプションをキーにした
+    非圧縮のFeatherファイルを作り、次回以降はメモリマップで読み込む。
+    CSVが更新されるとキーが変わり、更新前の内容のキャッシュは削除される。
+    pyarrowが無い場合やキャッシュを書けない場合は pd.read_csv と同じ結果を返す。
+    """
+    if feather is None:
+        return pd.read_csv(path, **read_csv_kwargs)
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        sha256 = source_fingerprint(path, cache_dir)
+    except OSError as e:
+        print(f"列指向キャッシュを利用できません: {e}")
+        return pd.read_csv(path, **read_csv_kwargs)
+
+    cache_path = _cache_path(path, cache_dir, sha256, read_csv_kwargs)
+    try:
+        table = feather.read_table(cache_path, memory_map=True)
+        return table.to_pandas()
+    except FileNotFoundError:
+        pass  # キャッシュが無い（または他のプロセスが削除した）場合はCSVを読み込む
+
+    df = pd.read_csv(path, **read_csv_kwargs)
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        table = pa.Table.from_pandas(df, preserve_index=not isinstance(df.index, pd.RangeIndex))
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, cache_path)
+        _remove_stale_caches(path, cache_dir, sha256)
+    except (OSError, pa.ArrowException) as e:
+        print(f"列指向キャッシュの書き込みに失敗しました: {e}")
+    return df
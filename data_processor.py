@@ -6,31 +6,107 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, confusion_matrix
 import joblib
 import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from columnar_cache import read_csv_cached
+from forest_export import CompiledRiskModels
+from model_bundle import save_bundle, source_model_hashes, training_data_hash
+from model_registry import FEATURES
+
+TARGETS = ['糖尿病', '高血圧', '心臓病']
 
 def load_and_process_data(file_path):
     """医療データの読み込みと前処理を行う関数"""
-    # CSVファイルを読み込む
-    df = pd.read_csv(file_path)
-    
-    # 必要な特徴量を選択
-    features = [
-        '年齢', '性別', 'BMI', '血圧_最高', '血圧_最低',
-        '運動頻度', '喫煙', '飲酒', '睡眠時間'
-    ]
-    
-    targets = ['糖尿病', '高血圧', '心臓病']
+    # CSVファイルを読み込む（2回目以降は列指向キャッシュから読み込む）
+    df = read_csv_cached(file_path)
     
     # 性別を数値に変換
     df['性別'] = df['性別'].map({'男性': 1, '女性': 0})
     
     # 特徴量とターゲットを分離
-    X = df[features]
-    y = df[targets]
+    X = df[FEATURES]
+    y = df[TARGETS]
     
     return X, y
 
-def train_models(X, y):
-    """複数の疾病に対するモデルの学習を行う関数"""
+# 医療データの列の型（フラグはint8、測定値はfloat64、性別はカテゴリ型）。
+# 測定値を float32 に丸めると木の閾値付近の値が閾値の反対側に移り、
+# load_and_process_data で読み込んだ場合と予測確率が変わるため、倍精度で読み込む
+MEDICAL_DATA_DTYPES = {
+    '年齢': 'int16',
+    '性別': pd.CategoricalDtype(['女性', '男性']),
+    '身長': 'float64',
+    '体重': 'float64',
+    '血圧_最高': 'float64',
+    '血圧_最低': 'float64',
+    '運動頻度': 'int8',
+    '喫煙': 'int8',
+    '飲酒': 'int8',
+    '睡眠時間': 'float64',
+    'BMI': 'float64',
+    '糖尿病': 'int8',
+    '高血圧': 'int8',
+    '心臓病': 'int8',
+}
+
+def load_and_process_data_chunks(file_path, chunksize=100_000):
+    """医療データをチャンク単位で読み込み、(X, y) を順に返すジェネレーター
+
+    load_and_process_data と同じ前処理を、明示した型でチャンクごとに行うため、
+    巨大なCSVでもメモリ使用量はチャンクサイズ分に抑えられる。
+    ターゲット列が無いファイル（予測用データなど）では y は None になる。
+
+    例: iter_predict_risks(models, scaler, (X for X, _ in load_and_process_data_chunks(path)))
+    """
+    wanted = set(FEATURES) | set(TARGETS)
+    reader = pd.read_csv(
+        file_path,
+        chunksize=chunksize,
+        usecols=lambda column: column in wanted,
+        dtype=MEDICAL_DATA_DTYPES,
+    )
+    for df in reader:
+        # 性別を数値に変換（カテゴリ番号が 女性=0, 男性=1 に対応する）
+        codes = df['性別'].cat.codes
+        if (codes < 0).any():
+            # 未知の値は load_and_process_data と同じく欠損値にする
+            df['性別'] = codes.astype('float32').where(codes >= 0)
+        else:
+            df['性別'] = codes.astype('int8')
+
+        targets = [target for target in TARGETS if target in df.columns]
+        yield df[FEATURES], (df[targets] if targets else None)
+
+def _fit_disease_model(disease, X_train_scaled, y_train, n_jobs=1):
+    """1疾病分のモデルを学習する関数（プロセスプールのワーカーからも呼ばれる）"""
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+
+    model = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=10,
+        min_samples_split=5,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+    model.fit(X_train_scaled, y_train)
+
+    timing = {
+        '学習時間[s]': time.perf_counter() - start_wall,
+        'CPU時間[s]': time.process_time() - start_cpu,
+    }
+    timing['CPU使用率[%]'] = 100 * timing['CPU時間[s]'] / timing['学習時間[s]']
+    return disease, model, timing
+
+def train_models(X, y, max_workers=None, n_jobs=1, return_timings=False):
+    """複数の疾病に対するモデルの学習を行う関数
+
+    各疾病のモデルはプロセスプールで並列に学習する。
+    max_workers はプロセス数（既定は疾病数とCPUコア数の小さい方、1なら逐次実行）、
+    n_jobs は各ランダムフォレスト内のスレッド数。
+    return_timings=True の場合は疾病ごとの学習時間・CPU使用率も返す。
+    """
     # データを訓練用とテスト用に分割
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
@@ -41,20 +117,31 @@ def train_models(X, y):
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    # 各疾病に対してモデルを学習
+    # 各疾病に対してモデルを並列に学習
+    diseases = list(y.columns)
+    if max_workers is None:
+        max_workers = min(len(diseases), os.cpu_count() or 1)
+
+    start_wall = time.perf_counter()
+    if max_workers <= 1:
+        results = [
+            _fit_disease_model(disease, X_train_scaled, y_train[disease], n_jobs)
+            for disease in diseases
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_fit_disease_model, disease, X_train_scaled, y_train[disease], n_jobs)
+                for disease in diseases
+            ]
+            results = [future.result() for future in futures]
+    total_wall = time.perf_counter() - start_wall
+
     models = {}
-    for disease in y.columns:
+    timings = {}
+    for disease, model, timing in results:
         print(f"\n{disease}のモデル学習:")
         
-        # モデルの学習
-        model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            min_samples_split=5,
-            random_state=42
-        )
-        model.fit(X_train_scaled, y_train[disease])
-        
         # モデルの評価
         y_pred = model.predict(X_test_scaled)
         print("\n分類レポート:")
@@ -69,11 +156,23 @@ def train_models(X, y):
         print(feature_importance)
         
         models[disease] = model
-    
+        timings[disease] = timing
+
+    # 学習時間の集計
+    print(f"\n学習時間（プロセス数: {max_workers}, スレッド数/モデル: {n_jobs}）:")
+    print(pd.DataFrame(timings).T.round(2))
+    print(f"全体の経過時間: {total_wall:.2f}秒")
+
+    if return_timings:
+        return models, scaler, timings
     return models, scaler
 
-def save_models(models, scaler, model_dir='models'):
-    """モデルを保存する関数"""
+def save_models(models, scaler, model_dir='models', training_hash=None):
+    """モデルを保存する関数
+
+    joblib形式に加えて、メモリマップで読み込めるバンドル（model_dir/bundle）も作る。
+    training_hash には model_bundle.training_data_hash で求めた学習データのハッシュを渡す。
+    """
     os.makedirs(model_dir, exist_ok=True)
     
     # 各疾病のモデルを保存
@@ -85,6 +184,16 @@ def save_models(models, scaler, model_dir='models'):
     scaler_path = os.path.join(model_dir, 'scaler.joblib')
     joblib.dump(scaler, scaler_path)
 
+    # バンドルの保存
+    compiled = CompiledRiskModels.from_sklearn(models, scaler)
+    save_bundle(
+        compiled,
+        os.path.join(model_dir, 'bundle'),
+        training_hash=training_hash,
+        sources=source_model_hashes(model_dir, list(models)),
+        model_dir=model_dir,
+    )
+
 def predict_risks(models, scaler, input_data):
     """健康リスクを予測する関数"""
     # 入力データの標準化
@@ -98,6 +207,50 @@ def predict_risks(models, scaler, input_data):
     
     return risks
 
+def predict_risks_batch(models, scaler, input_data, chunk_size=None):
+    """複数人分の健康リスクをまとめて予測する関数
+
+    input_data は (N, 9) の配列、または FEATURES の列を持つDataFrame。
+    スケーラーの変換と各疾病の predict_proba を1回ずつ呼び、
+    疾病ごとの確率を列に持つ N×3 のDataFrameを返す。
+    chunk_size を指定すると、その行数ごとに分けて予測する。
+    """
+    if chunk_size is not None:
+        chunks = (
+            input_data[start:start + chunk_size]
+            for start in range(0, len(input_data), chunk_size)
+        )
+        frames = list(iter_predict_risks(models, scaler, chunks))
+        if not frames:
+            return pd.DataFrame(columns=list(models), dtype=float)
+        return pd.concat(frames)
+
+    if isinstance(input_data, pd.DataFrame):
+        index = input_data.index
+        features = input_data[FEATURES]
+    else:
+        features = pd.DataFrame(np.asarray(input_data).reshape(-1, len(FEATURES)), columns=FEATURES)
+        index = features.index
+
+    # 入力データの標準化（全行まとめて1回）
+    input_scaled = scaler.transform(features)
+
+    # 各疾病のリスクを予測（疾病ごとに1回）
+    risks = {
+        disease: model.predict_proba(input_scaled)[:, 1]
+        for disease, model in models.items()
+    }
+    return pd.DataFrame(risks, index=index)
+
+def iter_predict_risks(models, scaler, chunks):
+    """チャンクの列を順に予測し、チャンクごとの結果を返すジェネレーター
+
+    pd.read_csv(..., chunksize=...) などと組み合わせると、
+    メモリに載り切らない入力もチャンク単位で予測できる。
+    """
+    for chunk in chunks:
+        yield predict_risks_batch(models, scaler, chunk)
+
 def generate_sample_medical_data(n_samples=1000):
     """現実的な医療データのサンプルを生成する関数"""
     np.random.seed(42)
@@ -151,6 +304,11 @@ def generate_sample_medical_data(n_samples=1000):
     return pd.DataFrame(data)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="疾病リスクモデルの学習")
+    parser.add_argument("--workers", type=int, default=None, help="並列に学習するプロセス数")
+    parser.add_argument("--n-jobs", type=int, default=1, help="各モデル内のスレッド数")
+    args = parser.parse_args()
+
     # 医療データの生成（実際のデータに置き換えてください）
     print("医療データの生成中...")
     medical_data = generate_sample_medical_data(n_samples=10000)
@@ -166,10 +324,10 @@ if __name__ == '__main__':
     
     # モデルの学習
     print("\nモデルの学習中...")
-    models, scaler = train_models(X, y)
+    models, scaler = train_models(X, y, max_workers=args.workers, n_jobs=args.n_jobs)
     
     # モデルの保存
     print("\nモデルの保存中...")
-    save_models(models, scaler)
+    save_models(models, scaler, training_hash=training_data_hash(X, y))
     
     print("\n処理が完了しました。") 
\ No newline at end of file
@@ -0,0 +1,58 @@
+# file_utils.py
+"""複数のモジュールで使うファイル操作（プロセス間のロック・原子的な書き込み）"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """プロセス間で排他するためのロックファイルを取得するコンテキストマネージャー"""
+    with open(path + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_text(path, text, mode=None):
+    """一時ファイルに書き込んでから置き換えることで、テキストファイルを原子的に更新する関数
+
+    一時ファイルは所有者のみが読み書きできる権限で作られるため、
+    他のユーザーにも読ませる場合は mode（例: 0o644）を指定する。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data, mode=None):
+    """JSONファイルを原子的に更新する関数"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2), mode)
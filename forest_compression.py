@@ -0,0 +1,270 @@
+# forest_compression.py
+"""学習済みのランダムフォレストを木の数・深さの削減と量子化で小さくするモジュール
+
+forest_export.py で配列形式に変換したフォレストに対して、
+- 先頭の n_trees 本だけを残す（ランダムフォレストの木は互いに独立に学習されている）
+- max_depth より深いノードを切り落とし、その深さのノードを葉にする
+  （内部ノードの value はそのノードに届いた学習データの陽性率なので、そのまま葉の確率に使える）
+- 閾値を float32 にする（float64 の閾値以下で最大の float32 に切り下げるため、float32 の特徴量との比較結果は変わらない）
+- 葉の確率を uint8（1/255刻み）または float16 にする
+を行い、疾病ごとに最小の組み合わせを選ぶ。予測確率はそのままリスクの割合として表示されるため、
+AUCの低下に加えて、個々の予測確率の変化とBrierスコア（確率の二乗誤差）の悪化も許容範囲に収める。
+組み合わせは train_models の検証データの半分（選択用）で選び、残りの半分（評価用）で結果を報告する。
+
+実行方法（リポジトリのルートで）:
+    python forest_compression.py --data data/raw/medical_data.csv
+    python forest_compression.py --data data/raw/medical_data.csv --tolerance 0.002 --value-dtype float16 \\
+        --output models/bundle_compressed
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sklearn.metrics import brier_score_loss, roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from data_processor import TARGETS, load_and_process_data
+from forest_export import CompiledForest, CompiledRiskModels
+from model_bundle import load_bundle, save_bundle, source_model_hashes, training_data_hash
+from model_registry import DISEASES, MODEL_DIR, ModelRegistry
+
+DEFAULT_AUC_TOLERANCE = 0.005
+# 1人分の予測確率の変化の上限と、Brierスコアの悪化の上限
+DEFAULT_MAX_PROBABILITY_CHANGE = 0.05
+DEFAULT_BRIER_TOLERANCE = 0.002
+TREE_COUNTS = (10, 20, 30, 50, 75, 100)
+DEPTHS = (4, 5, 6, 7, 8, 10)
+VALUE_DTYPES = {"uint8": (np.uint8, 1 / 255), "float16": (np.float16, 1.0), "float64": (np.float64, 1.0)}
+
+
+def floor_to_float32(values):
+    """各値以下で最大の float32 を返す関数（無限大はそのまま）"""
+    rounded = values.astype(np.float32)
+    too_large = rounded.astype(np.float64) > values
+    rounded[too_large] = np.nextafter(rounded[too_large], np.float32(-np.inf))
+    return rounded
+
+
+def quantize_values(values, value_dtype="uint8"):
+    """葉の確率を value_dtype に量子化し、(配列, value_scale) を返す関数"""
+    dtype, scale = VALUE_DTYPES[value_dtype]
+    if np.issubdtype(dtype, np.integer):
+        return np.rint(values / scale).astype(dtype), scale
+    return values.astype(dtype), scale
+
+
+def compress_forest(forest, n_trees=None, max_depth=None, value_dtype="uint8", float32_thresholds=True):
+    """CompiledForest の木の数・深さを減らし、閾値と確率を量子化した CompiledForest を返す関数
+
+    value_scale が 1 でない（量子化済みの）フォレストは入力にできない。
+    """
+    if forest.value_scale != 1.0:
+        raise ValueError("量子化済みのフォレストは圧縮できません")
+    n_trees = min(n_trees or forest.n_trees, forest.n_trees)
+    max_depth = min(max_depth or forest.max_depth, forest.max_depth)
+    left, right = forest.children
+
+    # 根から幅優先でたどり、残すノードを深さごとに集める
+    levels = [np.asarray(forest.roots[:n_trees], dtype=np.int64)]
+    for _ in range(max_depth):
+        nodes = levels[-1]
+        internal = nodes[left[nodes] != nodes]
+        if len(internal) == 0:
+            break
+        levels.append(np.concatenate([left[internal], right[internal]]))
+    kept = np.concatenate(levels)
+    deepest = levels[-1] if len(levels) > max_depth else np.empty(0, dtype=np.int64)
+
+    # 旧ノード番号から新しい番号への対応
+    new_index = np.full(len(forest.feature), -1, dtype=np.int64)
+    new_index[kept] = np.arange(len(kept))
+
+    is_leaf = left[kept] == kept
+    is_leaf[new_index[deepest]] = True  # 切り落とした深さのノードは葉にする
+    own = np.arange(len(kept))
+    index_dtype = np.uint16 if len(kept) <= np.iinfo(np.uint16).max else np.int32
+    children = np.stack([
+        np.where(is_leaf, own, new_index[left[kept]]),
+        np.where(is_leaf, own, new_index[right[kept]]),
+    ]).astype(index_dtype)
+
+    threshold = np.where(is_leaf, np.inf, forest.threshold[kept])
+    if float32_thresholds:
+        threshold = floor_to_float32(threshold)
+    value, value_scale = quantize_values(np.asarray(forest.value[kept], dtype=np.float64), value_dtype)
+
+    return CompiledForest(
+        feature=np.where(is_leaf, 0, forest.feature[kept]).astype(np.uint8),
+        threshold=threshold,
+        children=children,
+        value=value,
+        roots=np.arange(n_trees, dtype=index_dtype),
+        max_depth=len(levels) - 1,
+        value_scale=value_scale,
+    )
+
+
+def _time_per_call(func, min_time=0.2):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        func()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def _load_seconds(forest):
+    """フォレストの配列を .npy に保存し、読み込み直す時間を計測する"""
+    with tempfile.TemporaryDirectory() as directory:
+        arrays = forest.to_arrays()
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        start = time.perf_counter()
+        for name in arrays:
+            np.load(os.path.join(directory, f"{name}.npy"))
+        return time.perf_counter() - start
+
+
+def evaluate_forest(forest, X_scaled, y):
+    """AUC・Brierスコア・予測確率を返す関数"""
+    probabilities = forest.predict_positive(X_scaled)
+    return roc_auc_score(y, probabilities), brier_score_loss(y, probabilities), probabilities
+
+
+def choose_operating_point(forest, X_scaled, y, tolerance=DEFAULT_AUC_TOLERANCE, value_dtype="uint8",
+                           tree_counts=TREE_COUNTS, depths=DEPTHS,
+                           max_probability_change=DEFAULT_MAX_PROBABILITY_CHANGE,
+                           brier_tolerance=DEFAULT_BRIER_TOLERANCE):
+    """許容範囲に収まり、サイズが最小になる (木の数, 深さ) を選び、圧縮結果を返す関数
+
+    許容範囲は、元のフォレストと比べて AUCの低下が tolerance 以内、各行の予測確率の変化が
+    max_probability_change 以内、Brierスコアの悪化が brier_tolerance 以内であること。
+    X_scaled・y には選択用のデータを渡し、結果の評価には別のデータを使う。
+    戻り値は (圧縮したフォレスト, 評価結果の一覧)。評価結果は候補ごとの辞書。
+    """
+    base_auc, base_brier, base_probabilities = evaluate_forest(forest, X_scaled, y)
+    candidates = []
+    for n_trees in tree_counts:
+        for depth in depths:
+            if n_trees > forest.n_trees or depth > forest.max_depth:
+                continue
+            compressed = compress_forest(forest, n_trees, depth, value_dtype)
+            auc, brier, probabilities = evaluate_forest(compressed, X_scaled, y)
+            candidates.append({
+                "n_trees": n_trees,
+                "max_depth": depth,
+                "nbytes": compressed.nbytes,
+                "auc": auc,
+                "auc_delta": auc - base_auc,
+                "brier_delta": brier - base_brier,
+                "max_change": float(np.abs(probabilities - base_probabilities).max()),
+                "forest": compressed,
+            })
+
+    accepted = [
+        c for c in candidates
+        if c["auc_delta"] >= -tolerance
+        and c["max_change"] <= max_probability_change
+        and c["brier_delta"] <= brier_tolerance
+    ]
+    if not accepted:
+        # 許容範囲に収まる候補が無ければ、木の数・深さはそのままで量子化だけを行う
+        return compress_forest(forest, value_dtype=value_dtype), candidates
+    best = min(accepted, key=lambda c: (c["nbytes"], -c["auc"]))
+    return best["forest"], candidates
+
+
+def compression_report(original, compressed, X_scaled, y):
+    """圧縮前後のサイズ・読み込み時間・予測時間・精度を比べた辞書を返す関数"""
+    auc_before, brier_before, before = evaluate_forest(original, X_scaled, y)
+    auc_after, brier_after, after = evaluate_forest(compressed, X_scaled, y)
+    row = X_scaled[:1]
+    return {
+        "木の数": f"{original.n_trees} → {compressed.n_trees}",
+        "深さ": f"{original.max_depth} → {compressed.max_depth}",
+        "ノード数": f"{len(original.feature):,} → {len(compressed.feature):,}",
+        "サイズ[KB]": f"{original.nbytes / 1024:,.0f} → {compressed.nbytes / 1024:,.0f}",
+        "読み込み[ms]": f"{_load_seconds(original) * 1000:.2f} → {_load_seconds(compressed) * 1000:.2f}",
+        "1行の予測[ms]": (
+            f"{_time_per_call(lambda: original.predict_positive(row)) * 1000:.3f} → "
+            f"{_time_per_call(lambda: compressed.predict_positive(row)) * 1000:.3f}"
+        ),
+        f"{len(X_scaled):,}行の予測[ms]": (
+            f"{_time_per_call(lambda: original.predict_positive(X_scaled)) * 1000:.1f} → "
+            f"{_time_per_call(lambda: compressed.predict_positive(X_scaled)) * 1000:.1f}"
+        ),
+        "AUC": f"{auc_before:.4f} → {auc_after:.4f}（{auc_after - auc_before:+.4f}）",
+        "Brierスコア": f"{brier_before:.4f} → {brier_after:.4f}（{brier_after - brier_before:+.4f}）",
+        "確率の差（平均/最大）": f"{np.abs(after - before).mean():.4f} / {np.abs(after - before).max():.4f}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="学習に使った医療データのCSV（train_models と同じ分割の検証データを使う）")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_AUC_TOLERANCE, help="許容するAUCの低下幅")
+    parser.add_argument(
+        "--max-probability-change", type=float, default=DEFAULT_MAX_PROBABILITY_CHANGE,
+        help="許容する1人分の予測確率の変化の最大値",
+    )
+    parser.add_argument(
+        "--brier-tolerance", type=float, default=DEFAULT_BRIER_TOLERANCE, help="許容するBrierスコアの悪化幅"
+    )
+    parser.add_argument("--value-dtype", choices=list(VALUE_DTYPES), default="uint8", help="葉の確率の型")
+    parser.add_argument("--output", default=None, help="圧縮したモデルをバンドルとして保存するディレクトリ")
+    parser.add_argument("--show-candidates", action="store_true", help="全ての候補の評価結果とサイズを表示する")
+    args = parser.parse_args()
+
+    # train_models と同じ分割の検証データを、選択用と評価用に半分ずつ分ける。
+    # 同じデータで選んで評価すると、報告するAUCの低下が実際より小さく見えるため
+    X, y = load_and_process_data(args.data)
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_select, X_report, y_select, y_report = train_test_split(X_test, y_test, test_size=0.5, random_state=0)
+
+    registry = ModelRegistry(model_dir=args.model_dir, measure_memory=False)
+    models, scaler = registry.get_disease_models(DISEASES)
+    original = CompiledRiskModels.from_sklearn(models, scaler)
+    X_select_scaled = original.transform(X_select)
+    X_report_scaled = original.transform(X_report)
+
+    compressed = {}
+    for disease, forest in original.forests.items():
+        chosen, candidates = choose_operating_point(
+            forest, X_select_scaled, y_select[disease], args.tolerance, args.value_dtype,
+            max_probability_change=args.max_probability_change,
+            brier_tolerance=args.brier_tolerance,
+        )
+        compressed[disease] = chosen
+
+        print(
+            f"\n=== {disease}（許容範囲: AUC -{args.tolerance}, 確率の変化 {args.max_probability_change}, "
+            f"Brierスコア +{args.brier_tolerance}。評価用データ {len(X_report):,}行での結果）==="
+        )
+        for name, value in compression_report(forest, chosen, X_report_scaled, y_report[disease]).items():
+            print(f"{name:<20} {value}")
+        if args.show_candidates:
+            print(f"\n選択用データ {len(X_select):,}行での候補の評価:")
+            print(f"{'木の数':>6} {'深さ':>4} {'サイズ[KB]':>10} {'AUC':>8} {'差':>8} {'Brier差':>8} {'確率の変化':>10}")
+            for c in candidates:
+                print(
+                    f"{c['n_trees']:>6} {c['max_depth']:>4} {c['nbytes'] / 1024:>10,.0f} {c['auc']:>8.4f} "
+                    f"{c['auc_delta']:>+8.4f} {c['brier_delta']:>+8.4f} {c['max_change']:>10.4f}"
+                )
+
+    if args.output:
+        result = CompiledRiskModels(original.mean, original.scale, compressed, original.features)
+        manifest = save_bundle(
+            result, args.output,
+            training_hash=training_data_hash(X, y[TARGETS]),
+            sources=source_model_hashes(args.model_dir),
+            model_dir=args.model_dir,
+        )
+        load_bundle(args.output, model_dir=args.model_dir)
+        print(f"\n圧縮したモデルを保存しました: {args.output}（バージョン {manifest['version']}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# forest_export.py
+"""学習済みのランダムフォレストとスケーラーを配列だけの形式に変換し、NumPyで予測するモジュール
+
+sklearn の predict_proba は1行の予測でも入力の検証や木ごとの並列処理の準備に時間がかかる。
+ここでは全ての木のノードを1本の配列（特徴量番号・閾値・子ノード・確率）にまとめ、
+全ての木を同時に1段ずつたどることで、1行でも複数行でも同じ確率をすばやく求める。
+
+実行方法（リポジトリのルートで）:
+    python forest_export.py                    # models/ のモデルを models/compiled_models.npz に変換
+    python forest_export.py --check data/raw/medical_data.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from model_registry import DISEASES, FEATURES, MODEL_DIR, ModelRegistry
+
+COMPILED_MODELS_FILE = os.path.join(MODEL_DIR, "compiled_models.npz")
+# 一度にたどる行数（行数×木の数の作業用配列が大きくなりすぎないようにする）
+PREDICT_CHUNK_ROWS = 1024
+
+
+class CompiledForest:
+    """1つのランダムフォレスト（2クラス分類）を配列で表したもの
+
+    ノードは全ての木を通した番号で、roots[t] が t 本目の木の根。
+    葉の子ノードは自分自身を指すため、最大の深さの回数だけたどれば全ての木が葉に着く。
+    value は各ノードでの陽性クラスの確率（sklearn の木の predict_proba と同じ値）。
+    value を整数に量子化した場合は value × value_scale が確率になる（forest_compression.py）。
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, value_scale=1.0):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.value_scale = float(value_scale)
+
+    @classmethod
+    def from_sklearn(cls, forest, positive_class=1):
+        """学習済みの RandomForestClassifier から変換する"""
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        positive = list(forest.classes_).index(positive_class) if positive_class in forest.classes_ else None
+
+        features, thresholds, lefts, rights, values = [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            # 葉は自分自身を子に持たせ、特徴量番号は有効な値（0）にしておく
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+
+            counts = tree.value[:, 0, :]
+            if positive is None:
+                values.append(np.zeros(tree.node_count))
+            else:
+                values.append(counts[:, positive] / counts.sum(axis=1))
+
+        if forest.n_features_in_ > np.iinfo(np.uint8).max:
+            raise ValueError("特徴量の数が多すぎます（255個まで）")
+        return cls(
+            feature=np.concatenate(features).astype(np.uint8),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.stack([np.concatenate(lefts), np.concatenate(rights)]).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=offsets[:-1].astype(np.int32),
+            max_depth=max(tree.max_depth for tree in trees),
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def predict_positive(self, X):
+        """標準化済みの特徴量（float32, (N, 特徴量数)）から陽性クラスの確率を返す"""
+        n_rows, n_features = X.shape
+        n_nodes = np.int32(len(self.feature))
+        # 2次元の添字より1次元の take の方が速いため、平らにした配列の位置で引く
+        flat = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+        children = self.children.ravel()  # 左の子（n_nodes 個）、右の子（n_nodes 個）の順
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            # sklearn と同じく float32 の特徴量を float64 の閾値と比べ、以下なら左に進む
+            go_right = flat.take(row_offsets + self.feature.take(node)) > self.threshold.take(node)
+            node = children.take(node + go_right * n_nodes)
+        total = self.value.take(node).sum(axis=1, dtype=np.float64)
+        if self.value_scale != 1.0:
+            total *= self.value_scale
+        return total / self.n_trees
+
+    def to_arrays(self, prefix=""):
+        """保存用に配列の辞書に変換する"""
+        return {
+            f"{prefix}feature": self.feature,
+            f"{prefix}threshold": self.threshold,
+            f"{prefix}children": self.children,
+            f"{prefix}value": self.value,
+            f"{prefix}roots": self.roots,
+            f"{prefix}max_depth": np.asarray(self.max_depth),
+            f"{prefix}value_scale": np.asarray(self.value_scale),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=""):
+        return cls(
+            feature=arrays[f"{prefix}feature"],
+            threshold=arrays[f"{prefix}threshold"],
+            children=arrays[f"{prefix}children"],
+            value=arrays[f"{prefix}value"],
+            roots=arrays[f"{prefix}roots"],
+            max_depth=arrays[f"{prefix}max_depth"],
+            value_scale=arrays.get(f"{prefix}value_scale", 1.0),
+        )
+
+
+class CompiledRiskModels:
+    """スケーラーと疾病ごとのフォレストをまとめた、sklearn に依存しない予測器"""
+
+    def __init__(self, mean, scale, forests, features=FEATURES):
+        self.mean = mean
+        self.scale = scale
+        self.forests = forests
+        self.features = list(features)
+
+    @classmethod
+    def from_sklearn(cls, models, scaler, features=FEATURES):
+        """疾病ごとのモデルの辞書と StandardScaler から変換する"""
+        scale = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+        forests = {disease: CompiledForest.from_sklearn(model) for disease, model in models.items()}
+        return cls(np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64), forests, features)
+
+    @property
+    def nbytes(self):
+        return self.mean.nbytes + self.scale.nbytes + sum(f.nbytes for f in self.forests.values())
+
+    def transform(self, input_data):
+        """StandardScaler.transform と同じ計算で標準化し、木の比較用に float32 にする"""
+        if hasattr(input_data, "columns"):
+            input_data = input_data[self.features]
+        X = np.array(input_data, dtype=np.float64, ndmin=2)
+        X -= self.mean
+        X /= self.scale
+        return X.astype(np.float32)
+
+    def predict_proba(self, input_data):
+        """疾病ごとの陽性確率を (N, 疾病数) の配列で返す（列は self.forests の順）"""
+        X = self.transform(input_data)
+        result = np.empty((len(X), len(self.forests)))
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            chunk = X[start:start + PREDICT_CHUNK_ROWS]
+            for i, forest in enumerate(self.forests.values()):
+                result[start:start + PREDICT_CHUNK_ROWS, i] = forest.predict_positive(chunk)
+        return result
+
+    def predict_risks(self, input_data):
+        """1行分の入力から疾病ごとの確率の辞書を返す（data_processor.predict_risks と同じ形式）"""
+        probabilities = self.predict_proba(input_data)[0]
+        return dict(zip(self.forests, probabilities.tolist()))
+
+    def save(self, path=COMPILED_MODELS_FILE):
+        """非圧縮の .npz に保存する"""
+        arrays = {
+            "scaler_mean": self.mean,
+            "scaler_scale": self.scale,
+            "features": np.array(self.features),
+            "diseases": np.array(list(self.forests)),
+        }
+        for i, forest in enumerate(self.forests.values()):
+            arrays.update(forest.to_arrays(prefix=f"forest{i}_"))
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=COMPILED_MODELS_FILE):
+        with np.load(path) as arrays:
+            arrays = dict(arrays)
+        diseases = arrays["diseases"].tolist()
+        forests = {
+            disease: CompiledForest.from_arrays(arrays, prefix=f"forest{i}_")
+            for i, disease in enumerate(diseases)
+        }
+        return cls(arrays["scaler_mean"], arrays["scaler_scale"], forests, arrays["features"].tolist())
+
+
+def export_models(model_dir=MODEL_DIR, output_path=COMPILED_MODELS_FILE, diseases=DISEASES):
+    """model_dir の学習済みモデルを変換して保存し、変換結果を返す関数"""
+    registry = ModelRegistry(model_dir=model_dir, measure_memory=False)
+    models, scaler = registry.get_disease_models(diseases)
+    compiled = CompiledRiskModels.from_sklearn(models, scaler)
+    compiled.save(output_path)
+    return compiled
+
+
+def _load_check_data(path):
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df["性別"] = df["性別"].map({"男性": 1, "女性": 0})
+    return df[FEATURES].dropna()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--output", default=COMPILED_MODELS_FILE)
+    parser.add_argument("--check", default=None, help="変換前後の予測確率を比べるCSV（医療データ形式）")
+    args = parser.parse_args()
+
+    compiled = export_models(args.model_dir, args.output)
+    pickled = sum(
+        os.path.getsize(os.path.join(args.model_dir, f"{disease}_model.joblib")) for disease in compiled.forests
+    )
+    print(f"変換しました: {args.output}")
+    print(f"配列のサイズ: {compiled.nbytes / 1e6:.1f}MB（joblibファイルの合計: {pickled / 1e6:.1f}MB）")
+
+    if args.check:
+        from data_processor import predict_risks_batch
+
+        registry = ModelRegistry(model_dir=args.model_dir, measure_memory=False)
+        models, scaler = registry.get_disease_models(list(compiled.forests))
+        X = _load_check_data(args.check)
+
+        expected = predict_risks_batch(models, scaler, X)[list(compiled.forests)].to_numpy()
+        actual = compiled.predict_proba(X)
+        print(f"最大誤差（{len(X):,}行）: {np.abs(expected - actual).max():.3g}")
+
+        row = X.iloc[[0]]
+        for name, predict in [
+            ("sklearn", lambda: predict_risks_batch(models, scaler, row)),
+            ("配列形式", lambda: compiled.predict_proba(row.to_numpy())),
+        ]:
+            start = time.perf_counter()
+            for _ in range(20):
+                predict()
+            print(f"1行の予測（{name}）: {(time.perf_counter() - start) / 20 * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
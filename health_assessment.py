@@ -0,0 +1,218 @@
+# health_assessment.py
+from bisect import bisect_right
+from itertools import accumulate
+
+import numpy as np
+import pandas as pd
+
+DISEASES = ("糖尿病", "高血圧", "心臓病")
+
+# BMI判定の年齢区分
+AGE_BAND_UNDER_18 = 0
+AGE_BAND_ADULT = 1
+AGE_BAND_65_PLUS = 2
+
+# 年齢区分ごとのBMI閾値と判定結果（ラベル, 記号, 背景色, メッセージ）。
+# 閾値「未満」で区切り、最後の要素は最大の閾値以上の場合に使う。
+BMI_STATUS_BANDS = (
+    # 18歳未満
+    ((16, 17, 25, 30), (
+        ("痩せすぎ", "🔵", "#e3f2fd", "体重増加が必要かもしれません。"),
+        ("痩せ気味", "🔵", "#e3f2fd", "もう少し体重を増やすことを検討してください。"),
+        ("普通体重", "🟢", "#e8f5e9", "健康的な体重です。"),
+        ("やや体重過多", "🟡", "#fff3e0", "適度な運動を心がけましょう。"),
+        ("体重過多", "🔴", "#ffebee", "生活習慣の改善を検討してください。"),
+    )),
+    # 一般成人（日本肥満学会の基準に基づく）
+    ((16, 17, 18.5, 25, 30, 35, 40), (
+        ("痩せすぎ", "🔵", "#e3f2fd", "医療機関での相談をお勧めします。"),
+        ("痩せ", "🔵", "#e3f2fd", "体重増加を検討してください。"),
+        ("軽度痩せ", "🔵", "#e3f2fd", "もう少し体重を増やすことを検討してください。"),
+        ("普通体重", "🟢", "#e8f5e9", "健康的な体重です。このまま維持しましょう。"),
+        ("肥満（1度）", "🟡", "#fff3e0", "生活習慣の見直しを検討してください。"),
+        ("肥満（2度）", "🟠", "#fbe9e7", "計画的な改善をお勧めします。"),
+        ("肥満（3度）", "🔴", "#ffebee", "医療機関での相談をお勧めします。"),
+        ("肥満（4度）", "🔴", "#ffebee", "至急、医療機関での相談をお勧めします。"),
+    )),
+    # 65歳以上
+    ((18.5, 25, 27), (
+        ("低体重", "🔵", "#e3f2fd", "栄養バランスの改善を検討してください。"),
+        ("普通体重", "🟢", "#e8f5e9", "健康的な体重を維持できています。"),
+        ("やや高め", "🟡", "#fff3e0", "現状維持か、緩やかな改善を目指しましょう。"),
+        ("高体重", "🟠", "#fbe9e7", "徐々に改善を目指しましょう。"),
+    )),
+)
+
+# 全年齢区分の判定結果を1つにまとめた表。バッチ判定のコードはこの表の行番号。
+BMI_STATUS_TABLE = tuple(entry for _, entries in BMI_STATUS_BANDS for entry in entries)
+_BMI_STATUS_OFFSETS = tuple(accumulate((len(entries) for _, entries in BMI_STATUS_BANDS[:-1]), initial=0))
+
+# BMI区分ごとの基本リスク（18.5未満 / 25未満 / 30未満 / 35未満 / 35以上）
+RISK_BMI_THRESHOLDS = (18.5, 25, 30, 35)
+BASE_RISKS = (
+    {"糖尿病": 0.15, "高血圧": 0.1, "心臓病": 0.1},   # 低体重
+    {"糖尿病": 0.1, "高血圧": 0.1, "心臓病": 0.1},    # 普通体重
+    {"糖尿病": 0.2, "高血圧": 0.25, "心臓病": 0.2},   # 肥満（1度）
+    {"糖尿病": 0.35, "高血圧": 0.4, "心臓病": 0.3},   # 肥満（2度）
+    {"糖尿病": 0.5, "高血圧": 0.6, "心臓病": 0.4},    # 肥満（3度以上）
+)
+
+# 性別による調整
+GENDER_FACTORS = {
+    "男性": {"糖尿病": 1.1, "高血圧": 1.2, "心臓病": 1.3},
+    "女性": {"糖尿病": 1.0, "高血圧": 1.0, "心臓病": 1.0}
+}
+
+MAX_RISK = 0.95
+
+_BASE_RISK_MATRIX = np.array([[risks[d] for d in DISEASES] for risks in BASE_RISKS])
+_GENDERS = tuple(GENDER_FACTORS)
+_GENDER_FACTOR_MATRIX = np.array([[GENDER_FACTORS[g][d] for d in DISEASES] for g in _GENDERS])
+
+
+def bmi_age_band(age):
+    """BMI判定に使う年齢区分を返す関数"""
+    if age < 18:
+        return AGE_BAND_UNDER_18
+    elif age >= 65:
+        return AGE_BAND_65_PLUS
+    return AGE_BAND_ADULT
+
+
+def calculate_bmi_status(bmi, age, gender):
+    """BMIステータスを計算する関数"""
+    thresholds, entries = BMI_STATUS_BANDS[bmi_age_band(age)]
+    return entries[bisect_right(thresholds, bmi)]
+
+
+def calculate_bmi_status_batch(bmi, age):
+    """複数人分のBMIステータスをまとめて判定する関数
+
+    文字列を行数分作らないよう、BMI_STATUS_TABLE の行番号（int8）を返す。
+    戻り値は (codes, BMI_STATUS_TABLE) で、BMI_STATUS_TABLE[codes[i]] が
+    calculate_bmi_status の結果と一致する。
+    """
+    bmi = np.atleast_1d(np.asarray(bmi, dtype=np.float64))
+    age = np.atleast_1d(np.asarray(age, dtype=np.float64))
+
+    # NaNの年齢はスカラー版と同じく一般成人として扱われる
+    conditions = [age < 18, age >= 65]
+    age_band = np.select(conditions, [AGE_BAND_UNDER_18, AGE_BAND_65_PLUS], AGE_BAND_ADULT)
+
+    codes = np.empty(bmi.shape, dtype=np.int8)
+    for band, (thresholds, _) in enumerate(BMI_STATUS_BANDS):
+        mask = age_band == band
+        codes[mask] = _BMI_STATUS_OFFSETS[band] + np.searchsorted(thresholds, bmi[mask], side="right")
+    return codes, BMI_STATUS_TABLE
+
+
+def bmi_status_labels(codes):
+    """バッチ判定のコードを判定ラベルのCategoricalに変換する関数"""
+    labels = [entry[0] for entry in BMI_STATUS_TABLE]
+    categories = list(dict.fromkeys(labels))
+    label_codes = np.array([categories.index(label) for label in labels], dtype=np.int8)
+    return pd.Categorical.from_codes(label_codes.take(codes), categories=categories)
+
+
+def calculate_health_risks(bmi, age, gender):
+    """健康リスクを計算する関数"""
+    risks = {
+        "糖尿病": 0.0,
+        "高血圧": 0.0,
+        "心臓病": 0.0
+    }
+
+    # 基本リスク計算（BMIベース）
+    if bmi < 18.5:  # 低体重
+        base_risks = BASE_RISKS[0]
+    elif bmi < 25:  # 普通体重
+        base_risks = BASE_RISKS[1]
+    elif bmi < 30:  # 肥満（1度）
+        base_risks = BASE_RISKS[2]
+    elif bmi < 35:  # 肥満（2度）
+        base_risks = BASE_RISKS[3]
+    else:  # 肥満（3度以上）
+        base_risks = BASE_RISKS[4]
+
+    # 年齢による調整
+    age_factor = max(0, (age - 30) / 50)  # 30歳を基準として年齢による影響を計算
+
+    # 最終リスク計算
+    for disease in risks:
+        base_risk = base_risks[disease]
+        gender_factor = GENDER_FACTORS[gender][disease]
+
+        # リスク計算式の改善
+        risk = base_risk * (1 + age_factor) * gender_factor
+
+        # リスクの上限設定
+        risks[disease] = min(MAX_RISK, risk)
+
+    return risks
+
+
+def _match_genders(gender):
+    """性別の配列をGENDER_FACTORSの行番号に変換する（未対応の値は -1）"""
+    codes = np.full(gender.shape, -1, dtype=np.int8)
+    for code, name in enumerate(_GENDERS):
+        codes[gender == name] = code
+    return codes
+
+
+def _gender_codes(gender):
+    """性別の配列をGENDER_FACTORSの行番号に変換する
+
+    スカラー版と同じく、欠損値や未対応の値が含まれる場合は KeyError を送出する。
+    """
+    if isinstance(getattr(gender, "dtype", None), pd.CategoricalDtype):
+        # カテゴリ型ならカテゴリ数分の比較だけで済む。
+        # 欠損値のカテゴリ番号は -1 で、take では末尾のカテゴリになってしまうため別に扱う
+        gender = pd.Categorical(gender)
+        category_codes = _match_genders(np.asarray(gender.categories, dtype=object))
+        codes = np.full(gender.shape, -1, dtype=np.int8)
+        known = gender.codes >= 0
+        codes[known] = category_codes.take(gender.codes[known])
+        gender = np.asarray(gender, dtype=object)
+    else:
+        gender = np.asarray(gender)
+        codes = _match_genders(gender)
+    if (codes < 0).any():
+        unknown = sorted(set(gender[codes < 0].tolist()), key=str)
+        raise KeyError(f"未対応の性別が含まれています: {unknown}")
+    return codes
+
+
+def calculate_health_risks_batch(bmi=None, age=None, gender=None, data=None):
+    """複数人分の健康リスクをまとめて計算する関数
+
+    bmi・age・gender に配列を渡すか、data に「BMI」「年齢」「性別」列を持つ
+    DataFrameを渡す。結果は calculate_health_risks と同じ値で、
+    配列入力なら (N, 3) の配列（列は DISEASES の順）、
+    DataFrame入力なら同じインデックスを持つDataFrameを返す。
+    """
+    index = None
+    if data is not None:
+        index = data.index
+        bmi, age, gender = data["BMI"], data["年齢"], data["性別"]
+
+    bmi = np.atleast_1d(np.asarray(bmi, dtype=np.float64))
+    age = np.atleast_1d(np.asarray(age, dtype=np.float64))
+    if not isinstance(getattr(gender, "dtype", None), pd.CategoricalDtype):
+        gender = np.atleast_1d(gender)
+
+    # BMI区分（閾値未満で区切るため side="right"。NaNは最上位区分になり、スカラー版と一致する）
+    bands = np.searchsorted(RISK_BMI_THRESHOLDS, bmi, side="right")
+    risks = _BASE_RISK_MATRIX.take(bands, axis=0)
+
+    # 年齢による調整（NaNは max(0, nan) と同じく0として扱う）
+    age_factor = (age - 30) / 50
+    age_factor = np.where(age_factor > 0, age_factor, 0.0)
+
+    # スカラー版と同じ演算順序（基本リスク×年齢×性別）で計算し、浮動小数点の結果を一致させる
+    risks *= (1 + age_factor)[:, None]
+    risks *= _GENDER_FACTOR_MATRIX.take(_gender_codes(gender), axis=0)
+    np.minimum(risks, MAX_RISK, out=risks)
+
+    if index is not None:
+        return pd.DataFrame(risks, index=index, columns=list(DISEASES))
+    return risks
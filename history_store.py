@@ -0,0 +1,226 @@
+# history_store.py
+import glob
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USER_HISTORY_DIR = os.path.join(BASE_DIR, "user_history")
+USER_DATA_DIR = os.path.join(BASE_DIR, "user_data")
+HISTORY_DB = os.path.join(USER_HISTORY_DIR, "history.sqlite3")
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# user_data/<user>/prediction_history.json の旧形式のキー対応
+LEGACY_KEY_MAP = {
+    "日時": "datetime",
+    "性別": "gender",
+    "年齢": "age",
+    "身長": "height",
+    "体重": "weight",
+    "BMI": "bmi",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_user_datetime ON history (username, datetime);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def normalize_datetime(value):
+    """日時文字列をアプリ共通の形式（YYYY-MM-DD HH:MM）に揃える関数"""
+    try:
+        return datetime.fromisoformat(str(value)).strftime(DATETIME_FORMAT)
+    except ValueError:
+        return str(value)
+
+
+def normalize_legacy_record(record):
+    """旧形式（日本語キー）の履歴レコードを現在の形式に変換する関数"""
+    normalized = {LEGACY_KEY_MAP.get(key, key): value for key, value in record.items()}
+    if "datetime" in normalized:
+        normalized["datetime"] = normalize_datetime(normalized["datetime"])
+    return normalized
+
+
+class HistoryStore:
+    """SQLiteを使った追記型のユーザー診断履歴ストア
+
+    1件の保存はINSERT1回で済み、(username, datetime) のインデックスで検索する。
+    書き込みはトランザクション単位でSQLiteのファイルロックにより保護される。
+    """
+
+    def __init__(self, db_path=HISTORY_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        """スレッドごとの接続を取得する"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    def append(self, username, result):
+        """診断結果を1件追記する"""
+        record = json.dumps(result, ensure_ascii=False)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO history (username, datetime, record) VALUES (?, ?, ?)",
+                (username, str(result.get("datetime", "")), record),
+            )
+
+    def append_many(self, username, results):
+        """複数の診断結果をまとめて追記する"""
+        rows = [
+            (username, str(result.get("datetime", "")), json.dumps(result, ensure_ascii=False))
+            for result in results
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO history (username, datetime, record) VALUES (?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def load(self, username):
+        """ユーザーの全履歴を古い順に返す"""
+        rows = self._connect().execute(
+            "SELECT record FROM history WHERE username = ? ORDER BY datetime, id",
+            (username,),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def page(self, username, page_size=20, cursor=None):
+        """ユーザーの履歴を新しい順に1ページ分だけ返す
+
+        cursor には前のページで返された next_cursor を渡す。
+        (datetime, id) によるキーセットページングのため、表示する件数分だけを読み込む。
+        戻り値は (records, next_cursor) で、続きが無い場合 next_cursor は None。
+        """
+        if cursor is None:
+            rows = self._connect().execute(
+                "SELECT id, datetime, record FROM history WHERE username = ? "
+                "ORDER BY datetime DESC, id DESC LIMIT ?",
+                (username, page_size + 1),
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT id, datetime, record FROM history WHERE username = ? "
+                "AND (datetime, id) < (?, ?) "
+                "ORDER BY datetime DESC, id DESC LIMIT ?",
+                (username, cursor[0], cursor[1], page_size + 1),
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last_id, last_datetime, _ = rows[-1]
+            next_cursor = (last_datetime, last_id)
+        return [json.loads(row[2]) for row in rows], next_cursor
+
+    def count(self, username):
+        """ユーザーの履歴件数を返す"""
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM history WHERE username = ?", (username,)
+        ).fetchone()[0]
+
+    def migrate_legacy_json(self, history_dir=USER_HISTORY_DIR, user_data_dir=USER_DATA_DIR):
+        """既存のJSON履歴ファイルを一度だけ取り込む
+
+        取り込み済みかどうかはmetaテーブルに記録するため、元のファイルは変更しない。
+        """
+        with self._transaction() as conn:
+            done = conn.execute(
+                "SELECT value FROM meta WHERE key = 'legacy_json_migrated'"
+            ).fetchone()
+            if done is not None:
+                return 0
+
+            sources = []
+            for path in sorted(glob.glob(os.path.join(history_dir, "*.json"))):
+                username = os.path.splitext(os.path.basename(path))[0]
+                sources.append((username, path))
+            for path in sorted(glob.glob(os.path.join(user_data_dir, "*", "prediction_history.json"))):
+                username = os.path.basename(os.path.dirname(path))
+                sources.append((username, path))
+
+            rows = []
+            for username, path in sources:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        records = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Error in migrate_legacy_json ({path}): {str(e)}")
+                    continue
+                for record in records:
+                    record = normalize_legacy_record(record)
+                    rows.append((
+                        username,
+                        str(record.get("datetime", "")),
+                        json.dumps(record, ensure_ascii=False),
+                    ))
+
+            conn.executemany(
+                "INSERT INTO history (username, datetime, record) VALUES (?, ?, ?)", rows
+            )
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('legacy_json_migrated', ?)",
+                (datetime.now().isoformat(),),
+            )
+            return len(rows)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE で書き込みロックを取るトランザクション"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """プロセス全体で共有する履歴ストアを取得する関数（初回に旧JSONを移行）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+            _store.migrate_legacy_json()
+        return _store
+
+
+if __name__ == "__main__":
+    store = HistoryStore()
+    migrated = store.migrate_legacy_json()
+    print(f"{migrated}件の履歴を移行しました。")
@@ -0,0 +1,179 @@
+# latency_metrics.py
+import atexit
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from file_utils import atomic_write_json, atomic_write_text
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.path.join(BASE_DIR, "logs")
+METRICS_JSON_FILE = "latency_metrics.json"
+METRICS_PROMETHEUS_FILE = "latency_metrics.prom"
+METRIC_NAME = "diagnosis_stage_latency_seconds"
+
+# ヒストグラムのバケット上限（秒）。0.1ミリ秒から約105秒まで約1.19倍（2の4乗根）刻み
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** (k / 4) for k in range(81))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """処理時間の分布を固定バケットで数えるヒストグラム
+
+    観測値を全て保持せずにバケットごとの件数だけを持つため、メモリ使用量は一定。
+    パーセンタイルはバケット内を線形補間して推定する（Prometheusの histogram_quantile と同じ考え方）。
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は上限超え
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def quantile(self, q):
+        """q分位点（秒）を推定する"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - cumulative) / count
+                return min(max(value, self.min), self.max)
+            cumulative += count
+        return self.max
+
+    def summary(self):
+        summary = {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+        }
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = self.quantile(q)
+        return summary
+
+
+class LatencyMetrics:
+    """処理段階ごとの所要時間を集計するクラス
+
+    span() で囲んだ区間の時間を段階名ごとのヒストグラムに加える。
+    集計結果は summary() で取得でき、dump() でJSONとPrometheusのテキスト形式でファイルに書き出す。
+    """
+
+    def __init__(self, output_dir=METRICS_DIR):
+        self.output_dir = output_dir
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self._dumped_version = 0
+        self._dump_thread = None
+        self._stopped = threading.Event()
+
+    def observe(self, stage, seconds):
+        """段階 stage に所要時間（秒）を1件加える"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+            self._version += 1
+
+    @contextmanager
+    def span(self, stage):
+        """囲んだ区間の所要時間を段階 stage として記録するコンテキストマネージャー"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def summary(self):
+        """段階ごとの件数・合計・p50/p95/p99などを辞書で返す"""
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in sorted(self._histograms.items())}
+
+    def to_prometheus(self):
+        """Prometheusのテキスト形式（ヒストグラム）で集計結果を返す"""
+        lines = [
+            f"# HELP {METRIC_NAME} Latency of each stage of the diagnosis flow.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                label = stage.replace("\\", "\\\\").replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{METRIC_NAME}_sum{{stage="{label}"}} {histogram.sum:.9g}')
+                lines.append(f'{METRIC_NAME}_count{{stage="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self):
+        """集計結果を output_dir にJSONとPrometheusのテキスト形式で書き出す"""
+        with self._lock:
+            version = self._version
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Prometheus の textfile コレクターなど、別のユーザーのプロセスからも読めるようにする
+        atomic_write_json(os.path.join(self.output_dir, METRICS_JSON_FILE), {
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "stages": self.summary(),
+        }, mode=0o644)
+        atomic_write_text(os.path.join(self.output_dir, METRICS_PROMETHEUS_FILE), self.to_prometheus(), mode=0o644)
+        self._dumped_version = version
+
+    def start_periodic_dump(self, interval=15.0):
+        """interval 秒ごとに、更新があれば集計結果を書き出すスレッドを開始する"""
+        if self._dump_thread is not None:
+            return
+        self._dump_thread = threading.Thread(
+            target=self._run, args=(interval,), name="latency-metrics", daemon=True
+        )
+        self._dump_thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """書き出し用スレッドを止め、最新の集計結果を書き出す"""
+        self._stopped.set()
+        if self._version != self._dumped_version:
+            self.dump()
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            if self._version == self._dumped_version:
+                continue
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"レイテンシ指標の書き出しに失敗しました: {e}")
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_latency_metrics():
+    """プロセス全体で共有するレイテンシ指標を取得する関数（定期的な書き出しも開始する）"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = LatencyMetrics()
+            _metrics.start_periodic_dump()
+        return _metrics
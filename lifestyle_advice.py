@@ -0,0 +1,377 @@
+# lifestyle_advice.py
+from types import MappingProxyType
+
+import numpy as np
+
+ADVICE_CATEGORIES = ("運動", "食事", "生活習慣", "メンタルヘルス")
+
+# 年齢区分（若年 / 一般 / 高齢）と性別区分（女性以外 / 女性）
+AGE_BAND_YOUNG = 0
+AGE_BAND_ADULT = 1
+AGE_BAND_SENIOR = 2
+GENDER_BAND_OTHER = 0
+GENDER_BAND_FEMALE = 1
+
+
+class AdviceRules:
+    """BMI区分・年齢区分・性別区分ごとの生活アドバイスを事前に組み立てた規則表
+
+    生成時にすべての組み合わせ（BMI区分×年齢区分×性別区分）のアドバイスを
+    変更不可の辞書（値はタプル）として作っておき、呼び出し時は表を引くだけにする。
+    返す辞書は呼び出し元で共有されるため、変更できないようにしている。
+    """
+
+    def __init__(self, bmi_thresholds, bmi_advice, young_below=None, senior_above=None,
+                 age_adjustments=None, gender_adjustments=None):
+        self.bmi_thresholds = tuple(bmi_thresholds)
+        # 年齢区分: young_below 未満が若年、senior_above を超えると高齢（None なら区分しない）
+        self.young_below = young_below
+        self.senior_above = senior_above
+
+        age_adjustments = age_adjustments or {}
+        gender_adjustments = gender_adjustments or {}
+        table = []
+        for base in bmi_advice:
+            for age_band in (AGE_BAND_YOUNG, AGE_BAND_ADULT, AGE_BAND_SENIOR):
+                for gender_band in (GENDER_BAND_OTHER, GENDER_BAND_FEMALE):
+                    advice = {category: list(base.get(category, ())) for category in ADVICE_CATEGORIES}
+                    _apply_adjustment(advice, age_adjustments.get(age_band))
+                    _apply_adjustment(advice, gender_adjustments.get(gender_band))
+                    table.append(MappingProxyType({
+                        category: tuple(items) for category, items in advice.items()
+                    }))
+        self.table = tuple(table)
+
+    def bmi_band(self, bmi):
+        # 閾値「未満」で区切る（NaNは最上位の区分になる）
+        band = 0
+        for threshold in self.bmi_thresholds:
+            if not bmi < threshold:
+                band += 1
+            else:
+                break
+        return band
+
+    def age_band(self, age):
+        if self.senior_above is not None and age > self.senior_above:
+            return AGE_BAND_SENIOR
+        elif self.young_below is not None and age < self.young_below:
+            return AGE_BAND_YOUNG
+        return AGE_BAND_ADULT
+
+    @staticmethod
+    def gender_band(gender):
+        return GENDER_BAND_FEMALE if gender == "女性" else GENDER_BAND_OTHER
+
+    @staticmethod
+    def code(bmi_band, age_band, gender_band):
+        """区分の組み合わせを表の行番号に変換する"""
+        return (bmi_band * 3 + age_band) * 2 + gender_band
+
+    def advice(self, bmi, age, gender):
+        """1人分のアドバイスを返す（共有された変更不可の辞書）"""
+        return self.table[self.code(self.bmi_band(bmi), self.age_band(age), self.gender_band(gender))]
+
+    def band_codes(self, bmi, age, gender):
+        """複数人分のアドバイスを表の行番号（int16）でまとめて返す"""
+        bmi = np.atleast_1d(np.asarray(bmi, dtype=np.float64))
+        age = np.atleast_1d(np.asarray(age, dtype=np.float64))
+        gender = np.atleast_1d(gender)
+
+        bmi_band = np.searchsorted(self.bmi_thresholds, bmi, side="right")
+        conditions, choices = [], []
+        if self.senior_above is not None:
+            conditions.append(age > self.senior_above)
+            choices.append(AGE_BAND_SENIOR)
+        if self.young_below is not None:
+            conditions.append(age < self.young_below)
+            choices.append(AGE_BAND_YOUNG)
+        age_band = np.select(conditions, choices, AGE_BAND_ADULT) if conditions else AGE_BAND_ADULT
+        gender_band = (gender == "女性").astype(np.int16)
+        return ((bmi_band * 3 + age_band) * 2 + gender_band).astype(np.int16)
+
+
+def _apply_adjustment(advice, adjustment):
+    """年齢・性別による調整（文言の置換と追加）を適用する"""
+    if not adjustment:
+        return
+    for category, (old, new) in adjustment.get("replace", {}).items():
+        advice[category] = [item.replace(old, new) for item in advice[category]]
+    for category, items in adjustment.get("append", ()):
+        advice[category].extend(items)
+
+
+# 診断画面（app.py）のアドバイス
+APP_ADVICE_RULES = AdviceRules(
+    bmi_thresholds=(16.0, 18.5, 25, 30),
+    bmi_advice=(
+        # 重度の低体重（16.0未満）
+        {
+            "運動": (
+                "過度な有酸素運動は控えめにする",
+                "筋力トレーニングを中心に（週2-3回）",
+                "ストレッチで柔軟性を維持",
+                "疲労を感じたらすぐに休憩を取る",
+            ),
+            "食事": (
+                "1日6回程度の少量頻回食",
+                "良質なタンパク質を毎食摂取（肉、魚、卵、大豆製品）",
+                "健康的な脂質を積極的に摂取（ナッツ類、アボカド、オリーブオイル）",
+                "消化の良い炭水化物を選ぶ（白米、パン、パスタなど）",
+            ),
+            "生活習慣": (
+                "毎日の体重記録",
+                "十分な睡眠時間の確保（最低7-8時間）",
+                "定期的な医師の診察を受ける",
+                "過度な運動や活動を避ける",
+            ),
+            "メンタルヘルス": (
+                "無理なダイエットは避ける",
+                "体重増加のストレスを抱え込まない",
+                "必要に応じて専門家に相談",
+            ),
+        },
+        # 低体重（18.5未満）
+        {
+            "運動": (
+                "適度な筋力トレーニング（週2-3回）",
+                "軽い有酸素運動（ウォーキング等）",
+                "ヨガや軽いストレッチ",
+            ),
+            "食事": (
+                "1日3食＋間食2回の規則正しい食事",
+                "タンパク質を意識的に摂取",
+                "栄養バランスの良い食事を心がける",
+                "カロリー計算アプリの活用",
+            ),
+            "生活習慣": (
+                "規則正しい生活リズム",
+                "定期的な体重管理",
+                "適度な休息を取る",
+            ),
+            "メンタルヘルス": (
+                "健康的な体重管理を意識する",
+                "周囲のサポートを受け入れる",
+            ),
+        },
+        # 普通体重（25未満）
+        {
+            "運動": (
+                "定期的な有酸素運動（週3-4回）",
+                "筋力トレーニング（週2-3回）",
+                "ストレッチや柔軟体操",
+                "好きなスポーツを楽しむ",
+            ),
+            "食事": (
+                "バランスの良い食事",
+                "適切な食事量の維持",
+                "野菜を十分に摂取",
+                "水分を十分に摂取",
+            ),
+            "生活習慣": (
+                "規則正しい生活リズムの維持",
+                "定期的な健康診断",
+                "適度な運動習慣の継続",
+            ),
+            "メンタルヘルス": (
+                "ストレス解消法を見つける",
+                "趣味や運動で気分転換",
+            ),
+        },
+        # 肥満（1度）
+        {
+            "運動": (
+                "有酸素運動を中心に（週4-5回）",
+                "筋力トレーニングの併用",
+                "ウォーキングから始める",
+                "徐々に運動強度を上げる",
+            ),
+            "食事": (
+                "食事量の適正化",
+                "糖質の摂取を控えめに",
+                "野菜を先に食べる",
+                "間食を控える",
+                "食事記録をつける",
+            ),
+            "生活習慣": (
+                "毎日の体重記録",
+                "階段を使う",
+                "こまめに体を動かす",
+            ),
+            "メンタルヘルス": (
+                "無理のない目標設定",
+                "小さな成功を褒める",
+                "継続的な取り組みを心がける",
+            ),
+        },
+        # 肥満（2度以上）
+        {
+            "運動": (
+                "医師に相談の上で運動を開始",
+                "低強度の有酸素運動から始める",
+                "水中運動の検討",
+                "徐々に運動時間を延ばす",
+            ),
+            "食事": (
+                "栄養士への相談",
+                "食事内容の記録",
+                "食べる速度を遅くする",
+                "野菜を多く摂取",
+                "糖質・脂質の制限",
+            ),
+            "生活習慣": (
+                "定期的な医師の診察",
+                "毎日の体重・体調記録",
+                "生活リズムの改善",
+            ),
+            "メンタルヘルス": (
+                "専門家のサポートを受ける",
+                "家族や友人のサポートを得る",
+                "焦らず着実に改善を目指す",
+            ),
+        },
+    ),
+    young_below=25,
+    senior_above=65,
+    age_adjustments={
+        AGE_BAND_SENIOR: {
+            "replace": {"運動": ("強度", "負荷の軽い")},
+            "append": (
+                ("運動", ("関節に優しい運動を選ぶ",)),
+                ("生活習慣", ("転倒予防に注意する",)),
+            ),
+        },
+        AGE_BAND_YOUNG: {
+            "append": (
+                ("運動", ("成長期に合わせた適度な運動",)),
+                ("食事", ("成長に必要な栄養素の摂取",)),
+            ),
+        },
+    },
+    gender_adjustments={
+        GENDER_BAND_FEMALE: {
+            "append": (
+                ("食事", ("鉄分・カルシウムを意識的に摂取",)),
+                ("生活習慣", ("月経周期に合わせた体調管理",)),
+            ),
+        },
+        GENDER_BAND_OTHER: {
+            "append": (
+                ("食事", ("適切なタンパク質摂取を心がける",)),
+            ),
+        },
+    },
+)
+
+# 統計分析（MHLWDataProcessor）のアドバイス（年齢・性別による調整なし）
+MHLW_ADVICE_RULES = AdviceRules(
+    bmi_thresholds=(18.5, 25, 30),
+    bmi_advice=(
+        # 低体重（18.5未満）
+        {
+            "運動": (
+                "医師と相談しながら軽めの運動を取り入れる",
+                "筋力維持のためのストレッチや自重トレーニング",
+                "疲労を感じたら無理せず休む",
+            ),
+            "食事": (
+                "1日3食と間食を含めたエネルギー摂取を意識",
+                "タンパク質を毎食取り入れる（卵・肉・魚・豆など）",
+                "高カロリーかつ栄養価の高い食品を摂取（ナッツ・チーズなど）",
+            ),
+            "生活習慣": (
+                "毎日同じ時間に食事・睡眠をとる",
+                "体重・体調を定期的に記録する",
+                "定期的に健康診断を受ける",
+            ),
+            "メンタルヘルス": (
+                "体型への焦りを感じたら信頼できる人に相談",
+                "SNS等の情報に過度に影響されない",
+                "栄養士や心理カウンセラーへの相談も検討",
+            ),
+        },
+        # 普通体重（25未満）
+        {
+            "運動": (
+                "週2〜3回のウォーキングやジョギングを継続",
+                "柔軟体操やストレッチで姿勢改善も意識",
+                "デスクワーク中心の場合は1時間に1回立ち上がる",
+            ),
+            "食事": (
+                "主食・主菜・副菜を意識したバランスの良い食事",
+                "水分を意識してこまめに摂る",
+                "腹八分目を意識した食事量",
+            ),
+            "生活習慣": (
+                "朝型生活を意識し、日中活動を活発にする",
+                "適度なストレス解消法を見つける（趣味・運動など）",
+                "睡眠の質を高める習慣（就寝前スマホ制限など）",
+            ),
+            "メンタルヘルス": (
+                "過度に完璧を目指さず、自分を肯定する時間を作る",
+                "周囲の支援や環境に感謝する習慣を意識",
+            ),
+        },
+        # 肥満（1度）
+        {
+            "運動": (
+                "有酸素運動を週3回、1回30分程度から始める",
+                "ストレッチやラジオ体操を毎朝の習慣にする",
+                "階段を使う・一駅分歩くなど日常動作を増やす",
+            ),
+            "食事": (
+                "野菜から食べ始めて血糖値の急上昇を抑える",
+                "甘い飲料を控え、お茶や水に置き換える",
+                "間食を1日1回以内に減らす",
+            ),
+            "生活習慣": (
+                "毎朝・夜に体重を記録し可視化する",
+                "夜更かしや深夜の食事を避ける",
+                "1日8000歩以上を目標に歩数管理",
+            ),
+            "メンタルヘルス": (
+                "目標体重を小さく区切って設定（例：-1kg/月）",
+                "できたことを日記やアプリで記録して自信に変える",
+            ),
+        },
+        # 肥満（2度以上）
+        {
+            "運動": (
+                "医師や専門家に相談の上、安全な運動計画を立てる",
+                "プールでの水中運動や椅子体操など負荷の少ない活動を中心に",
+                "一度にたくさん運動するより、短時間を毎日続けることを意識",
+            ),
+            "食事": (
+                "栄養士の指導のもと1日の摂取カロリーを見直す",
+                "加工食品や外食の頻度を減らす",
+                "腹八分目で満足する訓練を意識する",
+            ),
+            "生活習慣": (
+                "健康記録アプリを使って摂取量や活動を記録",
+                "毎週決まった曜日に体重・体脂肪率をチェック",
+                "就寝時間を一定に保ち、睡眠時間を6時間以上確保",
+            ),
+            "メンタルヘルス": (
+                "短期的な結果に一喜一憂せず、長期視点で考える",
+                "体型の変化だけでなく、気分・体調の変化にも注目する",
+                "応援してくれる人を見つけ、感謝を共有する",
+            ),
+        },
+    ),
+)
+
+
+def generate_lifestyle_advice(bmi, age, gender, rules=APP_ADVICE_RULES):
+    """BMI、年齢、性別に基づいて生活アドバイスを返す関数
+
+    カテゴリ名からアドバイスのタプルを引ける変更不可の辞書を返す（呼び出し間で共有される）。
+    """
+    return rules.advice(bmi, age, gender)
+
+
+def advice_band_codes(bmi, age, gender, rules=APP_ADVICE_RULES):
+    """複数人分のアドバイスの区分コードをまとめて求める関数
+
+    rules.table[code] が generate_lifestyle_advice の結果と同じ辞書になる。
+    """
+    return rules.band_codes(bmi, age, gender)
@@ -4,11 +4,432 @@ import seaborn as sns
 import japanize_matplotlib
 import numpy as np
 import os
+import io
+import hashlib
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from columnar_cache import read_csv_cached
+from lifestyle_advice import MHLW_ADVICE_RULES, generate_lifestyle_advice
+from chart_data import MAX_SCATTER_POINTS, box_summary, downsample_scatter, histogram_summary
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 国民健康・栄養調査 第20表（拡張子はcsvだが中身はxlsx）
+BMI_STATS_FILE = os.path.join(BASE_DIR, "bmi_stats.csv")
+AGE_RANGES = ("20-29歳", "30-39歳", "40-49歳", "50-59歳", "60-69歳", "70歳以上")
+XLSX_MAGIC = b"PK\x03\x04"
+
+# 生成・読み込み済みデータセットを保持するメモリ量の上限
+DATASET_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_bmi_stats_cache = {}
+_bmi_stats_lock = threading.Lock()
+
+
+def get_age_range(age):
+    """年齢を統計表の年齢層に変換する関数"""
+    if 20 <= age < 30:
+        return "20-29歳"
+    elif 30 <= age < 40:
+        return "30-39歳"
+    elif 40 <= age < 50:
+        return "40-49歳"
+    elif 50 <= age < 60:
+        return "50-59歳"
+    elif 60 <= age < 70:
+        return "60-69歳"
+    else:
+        return "70歳以上"
+
+
+def get_bmi_category(bmi, gender):
+    """BMIと性別を統計表のカテゴリに変換する関数"""
+    if gender == "男性":
+        return "BMI＜25、腹囲＜85ｃｍ" if bmi < 25 else "BMI≧25、腹囲≧85ｃｍ"
+    else:
+        return "BMI＜25、腹囲＜90ｃｍ" if bmi < 25 else "BMI≧25、腹囲≧90ｃｍ"
+
+
+def _parse_bmi_stats_xlsx(path):
+    """第20表（横持ちのxlsx）を 性別・年齢層・カテゴリ・割合 の縦持ちに変換する関数"""
+    sheet = pd.read_excel(path, header=None)
+
+    # 年齢層の見出し行を探し、各年齢層の「％」列（人数列の右隣）を特定する
+    header_row = next(i for i, row in sheet.iterrows() if "20-29歳" in row.values)
+    percent_columns = {
+        label: sheet.columns[list(sheet.iloc[header_row]).index(label) + 1]
+        for label in AGE_RANGES
+    }
+
+    genders = sheet[0].ffill()
+    rows = []
+    for i in range(header_row + 1, len(sheet)):
+        category = sheet.iat[i, 1]
+        if not isinstance(category, str) or not isinstance(genders[i], str):
+            continue
+        for age_range, column in percent_columns.items():
+            rows.append({
+                "性別": genders[i].strip(),
+                "年齢層": age_range,
+                "カテゴリ": category.strip(),
+                "割合": sheet.at[i, column],
+            })
+    return pd.DataFrame(rows)
+
+
+def read_bmi_stats(path=BMI_STATS_FILE):
+    """BMI統計表を読み込む関数（xlsx・csvを中身で判別する）"""
+    with open(path, "rb") as f:
+        magic = f.read(len(XLSX_MAGIC))
+    if magic == XLSX_MAGIC:
+        stats_df = _parse_bmi_stats_xlsx(path)
+    else:
+        stats_df = pd.read_csv(path, encoding="utf-8")
+    return stats_df.dropna(subset=["割合"])
+
+
+def build_bmi_stats_index(stats_df):
+    """(性別, 年齢層, カテゴリ) をキーに割合を引ける辞書を作る関数"""
+    categories = {
+        get_bmi_category(bmi, gender)
+        for gender in ("男性", "女性")
+        for bmi in (0, 25)
+    }
+    index = {}
+    for row in stats_df.itertuples(index=False):
+        gender, age_range, text, percentage = row.性別, row.年齢層, str(row.カテゴリ), row.割合
+        for category in categories:
+            # 元の str.contains と同じく、先に現れた行を優先する
+            if category in text:
+                index.setdefault((gender, age_range, category), float(percentage))
+    return index
+
+
+def load_bmi_stats_index(path=BMI_STATS_FILE):
+    """BMI統計表のインデックスを取得する関数（ファイル更新時のみ再構築）"""
+    stat = os.stat(path)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+    with _bmi_stats_lock:
+        cached = _bmi_stats_cache.get(path)
+        if cached is None or cached[0] != stat_key:
+            cached = (stat_key, build_bmi_stats_index(read_bmi_stats(path)))
+            _bmi_stats_cache[path] = cached
+        return cached[1]
+
+
+# 統計のグループ化キーとして使える派生列（年齢から年齢層を作る。20歳未満は対象外）
+DERIVED_GROUP_KEYS = {
+    "年齢層": lambda data: pd.cut(
+        data["年齢"], bins=[20, 30, 40, 50, 60, 70, np.inf], right=False, labels=list(AGE_RANGES)
+    ),
+}
+
+# 統計量の名前と (列, 集計関数)
+STATISTIC_AGGREGATIONS = {
+    "BMI平均": ("BMI", "mean"),
+    "BMI中央値": ("BMI", "median"),
+    "BMI標準偏差": ("BMI", "std"),
+    "年齢平均": ("年齢", "mean"),
+    "件数": ("BMI", "count"),
+}
+
+
+# 全体の年齢平均をグループごとの集計から求めるための補助の集計（年齢に欠損がある場合に必要）
+_AGE_COUNT_AGGREGATION = {"_年齢件数": ("年齢", "count")}
+
+
+def _combine_group_statistics(table):
+    """グループごとの平均・標準偏差・件数から全体の平均・標準偏差・件数・年齢平均を求める関数"""
+    counts = table["件数"]
+    total = counts.sum()
+    mean = (table["BMI平均"] * counts).sum() / total if total else np.nan
+    # 群内の偏差平方和と群間の偏差平方和を足して全体の分散を求める（件数1・0の群は0）
+    within = ((counts - 1) * table["BMI標準偏差"] ** 2).fillna(0).sum()
+    between = (counts * (table["BMI平均"] - mean) ** 2).fillna(0).sum()
+    age_counts = table["_年齢件数"]
+    age_total = age_counts.sum()
+    return {
+        "BMI平均": float(mean),
+        "BMI標準偏差": float(np.sqrt((within + between) / (total - 1))) if total > 1 else np.nan,
+        "年齢平均": float((table["年齢平均"] * age_counts).sum() / age_total) if age_total else np.nan,
+        "件数": int(total),
+    }
+
+
+def compute_group_statistics(data, by=None, quantiles=None):
+    """全体とグループごとの統計量を1回の集計で求める関数
+
+    by には列名（またはそのリスト）を指定する。「性別」「運動習慣」「喫煙」などの列のほか、
+    DERIVED_GROUP_KEYS の「年齢層」も使える。quantiles に [0.25, 0.75] のように
+    指定すると「BMI25%点」などの分位点も加える。
+    グループごとにデータをコピーせず groupby().agg() でまとめて計算し、全体の平均・標準偏差・件数も
+    その結果から求める。中央値と分位点はグループの集計から求められないため、BMI列だけから計算する。
+    {"全体": {...}, グループ名: {...}, ...} の辞書を返す（複数キーならグループ名はタプル）。
+    """
+    quantiles = list(quantiles or [])
+    bmi_quantiles = data["BMI"].quantile([0.5] + quantiles).tolist()
+
+    if by is None:
+        stats = {"全体": {
+            name: float(data[column].agg(func))
+            for name, (column, func) in STATISTIC_AGGREGATIONS.items()
+            if name != "BMI中央値"
+        }}
+        stats["全体"]["件数"] = int(stats["全体"]["件数"])
+    else:
+        keys = [by] if isinstance(by, str) else list(by)
+        group_keys = [
+            DERIVED_GROUP_KEYS[key](data).rename(key) if key in DERIVED_GROUP_KEYS and key not in data.columns else data[key]
+            for key in keys
+        ]
+        # キーが欠損している行も全体の統計には含めるため、欠損値のグループも集計する
+        grouped = data.groupby(group_keys, observed=True, sort=False, dropna=False)
+        table = grouped.agg(**STATISTIC_AGGREGATIONS, **_AGE_COUNT_AGGREGATION)
+        stats = {"全体": _combine_group_statistics(table)}
+
+        table = table[table.index.to_frame().notna().all(axis=1).to_numpy()]
+        table = table[list(STATISTIC_AGGREGATIONS)]
+        if quantiles:
+            quantile_table = grouped["BMI"].quantile(quantiles).unstack()
+            quantile_table.columns = [f"BMI{q * 100:g}%点" for q in quantile_table.columns]
+            table = table.join(quantile_table)
+
+        for group, row in zip(table.index, table.to_dict("records")):
+            row["件数"] = int(row["件数"])
+            stats[group] = row
+
+    overall = stats["全体"]
+    overall["BMI中央値"] = bmi_quantiles[0]
+    # 項目の順序をグループごとの統計量と揃える
+    overall = {name: overall[name] for name in STATISTIC_AGGREGATIONS}
+    for q, value in zip(quantiles, bmi_quantiles[1:]):
+        overall[f"BMI{q * 100:g}%点"] = value
+    stats["全体"] = overall
+    return stats
+
+
+def _draw_bmi_distribution(data, path):
+    plt.figure(figsize=(10, 6))
+    sns.histplot(data=data, x='BMI', bins=30)
+    plt.title('BMIの分布')
+    plt.xlabel('BMI')
+    plt.ylabel('頻度')
+    plt.savefig(path)
+    plt.close()
+
+
+def _draw_bmi_by_gender(data, path):
+    plt.figure(figsize=(12, 6))
+    sns.boxplot(data=data, x='性別', y='BMI')
+    plt.title('性別ごとのBMI分布')
+    plt.savefig(path)
+    plt.close()
+
+
+def _draw_age_bmi_relation(data, path):
+    plt.figure(figsize=(10, 6))
+    sns.scatterplot(data=data, x='年齢', y='BMI', hue='性別', alpha=0.5)
+    plt.title('年齢とBMIの関係')
+    plt.savefig(path)
+    plt.close()
+
+
+# レポートのグラフ（ファイル名と描画関数）
+REPORT_PLOTS = {
+    'bmi_distribution.png': _draw_bmi_distribution,
+    'bmi_by_gender.png': _draw_bmi_by_gender,
+    'age_bmi_relation.png': _draw_age_bmi_relation,
+}
+REPORT_COLUMNS = ['年齢', 'BMI', '性別']
+REPORT_MANIFEST = 'report_manifest.json'
+
+
+def report_data_hash(data):
+    """グラフに使う列の内容からハッシュを求める関数"""
+    values = pd.util.hash_pandas_object(data[REPORT_COLUMNS], index=False).values
+    return hashlib.sha256(values.tobytes()).hexdigest()
+
+
+def _render_plot(filename, data, path):
+    """プロセスプールのワーカーでグラフを1枚描画する"""
+    REPORT_PLOTS[filename](data, path)
+    return path
+
+
+def _read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, REPORT_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, REPORT_MANIFEST)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def render_cohort_reports(cohorts, output_dir, max_workers=None):
+    """複数コホートのレポート画像をプロセスプールで並列に描画する関数
+
+    cohorts は {コホート名: DataFrame}。各コホートの画像は output_dir/<コホート名>/ に
+    （名前がNoneなら output_dir 直下に）出力する。出力先の report_manifest.json に
+    データのハッシュを記録し、前回と同じデータの画像は描画を省略する。
+    戻り値は {コホート名: {ファイル名: (パス, 描画したか)}}。
+    """
+    jobs = []
+    results = {}
+    manifests = {}
+    for name, data in cohorts.items():
+        cohort_dir = output_dir if name is None else os.path.join(output_dir, str(name))
+        os.makedirs(cohort_dir, exist_ok=True)
+        manifest = manifests.setdefault(cohort_dir, _read_manifest(cohort_dir))
+        data = data[REPORT_COLUMNS]
+        data_hash = report_data_hash(data)
+
+        results[name] = {}
+        for filename in REPORT_PLOTS:
+            path = os.path.join(cohort_dir, filename)
+            if manifest.get(filename) == data_hash and os.path.exists(path):
+                results[name][filename] = (path, False)
+            else:
+                jobs.append((name, cohort_dir, filename, data, data_hash, path))
+
+    if jobs:
+        if max_workers == 1:
+            for job in jobs:
+                _render_plot(job[2], job[3], job[5])
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_render_plot, job[2], job[3], job[5]) for job in jobs]
+                for future in futures:
+                    future.result()
+
+        for name, cohort_dir, filename, _, data_hash, path in jobs:
+            manifests[cohort_dir][filename] = data_hash
+            results[name][filename] = (path, True)
+        for cohort_dir, manifest in manifests.items():
+            _write_manifest(cohort_dir, manifest)
+
+    return results
+
+
+def _estimate_nbytes(obj):
+    """キャッシュするオブジェクトのおおよそのメモリ使用量を返す関数"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    # 統計やグラフ用のデータは、DataFrameや配列を値に持つ辞書・リストになっている
+    if isinstance(obj, dict):
+        return sum(_estimate_nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_estimate_nbytes(value) for value in obj)
+    return 0
+
+
+class _CacheEntry:
+    def __init__(self, data):
+        self.data = data
+        self.derived = {}
+        self.nbytes = _estimate_nbytes(data)
+
+
+class DatasetCache:
+    """データセットと派生した統計をまとめて保持するLRUキャッシュ
+
+    Streamlitの再実行やセッションをまたいでプロセス内で共有される。
+    合計のメモリ使用量が max_bytes を超えると、最も使われていないものから破棄する。
+    キャッシュされたDataFrameは共有されるため、呼び出し側で変更しないこと。
+    """
+
+    def __init__(self, max_bytes=DATASET_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def get(self, key):
+        """キーに対応するデータセットを返す（無ければNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry.data
+
+    def put(self, key, data):
+        """データセットを登録し、上限を超えた分を古い順に破棄する"""
+        with self._lock:
+            self._entries[key] = _CacheEntry(data)
+            self._entries.move_to_end(key)
+            self._evict()
+            return data
+
+    def memoize(self, key, name, compute):
+        """データセットから派生した値を計算済みなら再利用する
+
+        計算中に他のセッションのキャッシュ参照を止めないよう、compute はロックの外で呼ぶ。
+        同時に計算された場合は先に登録された値を使う。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and name in entry.derived:
+                return entry.derived[name]
+
+        value = compute()
+        with self._lock:
+            if entry is None or self._entries.get(key) is not entry:
+                # 計算中に破棄・置き換えられたデータセットには登録しない
+                return value
+            if name not in entry.derived:
+                entry.derived[name] = value
+                entry.nbytes += _estimate_nbytes(value)
+                self._evict()
+            return entry.derived[name]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        # 直前に使ったものは上限を超えていても残す
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            self._entries.popitem(last=False)
+
+
+_dataset_cache = DatasetCache()
+
+
+def get_dataset_cache():
+    """プロセス全体で共有するデータセットキャッシュを取得する関数"""
+    return _dataset_cache
+
 
 class MHLWDataProcessor:
-    def load_sample_data(self):
-        np.random.seed(42)
-        n_samples = 1000
+    def __init__(self):
+        self.data = None
+        # 読み込んだデータのキャッシュキー（統計の再利用に使う）
+        self.cache_key = None
+
+    def load_sample_data(self, seed=42, n_samples=1000):
+        key = ("sample", seed, n_samples)
+        cached = _dataset_cache.get(key)
+        if cached is not None:
+            self.data = cached
+            self.cache_key = key
+            return self.data
+
+        np.random.seed(seed)
 
         data = {
             '年齢': np.random.normal(50, 15, n_samples),
@@ -21,148 +442,49 @@ class MHLWDataProcessor:
         self.data = pd.DataFrame(data)
         self.data['年齢'] = self.data['年齢'].astype(int)
         self.data = self.data[(self.data['年齢'] >= 20) & (self.data['年齢'] <= 90) & (self.data['BMI'] >= 15) & (self.data['BMI'] <= 40)]
+        self.data = _dataset_cache.put(key, self.data)
+        self.cache_key = key
         return self.data
 
     def compare_user_to_stats(self, bmi, age, gender):
         try:
-            stats_df = pd.read_csv("bmi_stats.csv")
-        except:
+            stats_index = load_bmi_stats_index()
+        except Exception as e:
+            print(f"統計データ読み込み失敗: {e}")
             return "統計データが読み込めませんでした。"
 
-        def get_age_range(age):
-            if 20 <= age < 30:
-                return "20-29歳"
-            elif 30 <= age < 40:
-                return "30-39歳"
-            elif 40 <= age < 50:
-                return "40-49歳"
-            elif 50 <= age < 60:
-                return "50-59歳"
-            elif 60 <= age < 70:
-                return "60-69歳"
-            else:
-                return "70歳以上"
-
-        def get_bmi_category(bmi, gender):
-            if gender == "男性":
-                return "BMI＜25、腹囲＜85ｃｍ" if bmi < 25 else "BMI≧25、腹囲≧85ｃｍ"
-            else:
-                return "BMI＜25、腹囲＜90ｃｍ" if bmi < 25 else "BMI≧25、腹囲≧90ｃｍ"
-
         age_range = get_age_range(age)
         category = get_bmi_category(bmi, gender)
 
-        row = stats_df[
-            (stats_df["性別"] == gender) &
-            (stats_df["年齢層"] == age_range) &
-            (stats_df["カテゴリ"].str.contains(category))
-        ]
-
-        if not row.empty:
-            percentage = row["割合"].values[0]
+        percentage = stats_index.get((gender, age_range, category))
+        if percentage is not None:
             return f"{age_range}の{gender}のうち、{category}の人は {percentage:.1f}% です。"
         else:
             return "統計データに一致する項目が見つかりませんでした。"
 
     def generate_lifestyle_advice(self, bmi, age, gender):
-        advice = {
-            "運動": [],
-            "食事": [],
-            "生活習慣": [],
-            "メンタルヘルス": []
-        }
-
-        if bmi < 18.5:
-            advice["運動"] = [
-                "医師と相談しながら軽めの運動を取り入れる",
-                "筋力維持のためのストレッチや自重トレーニング",
-                "疲労を感じたら無理せず休む"
-            ]
-            advice["食事"] = [
-                "1日3食と間食を含めたエネルギー摂取を意識",
-                "タンパク質を毎食取り入れる（卵・肉・魚・豆など）",
-                "高カロリーかつ栄養価の高い食品を摂取（ナッツ・チーズなど）"
-            ]
-            advice["生活習慣"] = [
-                "毎日同じ時間に食事・睡眠をとる",
-                "体重・体調を定期的に記録する",
-                "定期的に健康診断を受ける"
-            ]
-            advice["メンタルヘルス"] = [
-                "体型への焦りを感じたら信頼できる人に相談",
-                "SNS等の情報に過度に影響されない",
-                "栄養士や心理カウンセラーへの相談も検討"
-            ]
-
-        elif 18.5 <= bmi < 25:
-            advice["運動"] = [
-                "週2〜3回のウォーキングやジョギングを継続",
-                "柔軟体操やストレッチで姿勢改善も意識",
-                "デスクワーク中心の場合は1時間に1回立ち上がる"
-            ]
-            advice["食事"] = [
-                "主食・主菜・副菜を意識したバランスの良い食事",
-                "水分を意識してこまめに摂る",
-                "腹八分目を意識した食事量"
-            ]
-            advice["生活習慣"] = [
-                "朝型生活を意識し、日中活動を活発にする",
-                "適度なストレス解消法を見つける（趣味・運動など）",
-                "睡眠の質を高める習慣（就寝前スマホ制限など）"
-            ]
-            advice["メンタルヘルス"] = [
-                "過度に完璧を目指さず、自分を肯定する時間を作る",
-                "周囲の支援や環境に感謝する習慣を意識"
-            ]
-
-        elif 25 <= bmi < 30:
-            advice["運動"] = [
-                "有酸素運動を週3回、1回30分程度から始める",
-                "ストレッチやラジオ体操を毎朝の習慣にする",
-                "階段を使う・一駅分歩くなど日常動作を増やす"
-            ]
-            advice["食事"] = [
-                "野菜から食べ始めて血糖値の急上昇を抑える",
-                "甘い飲料を控え、お茶や水に置き換える",
-                "間食を1日1回以内に減らす"
-            ]
-            advice["生活習慣"] = [
-                "毎朝・夜に体重を記録し可視化する",
-                "夜更かしや深夜の食事を避ける",
-                "1日8000歩以上を目標に歩数管理"
-            ]
-            advice["メンタルヘルス"] = [
-                "目標体重を小さく区切って設定（例：-1kg/月）",
-                "できたことを日記やアプリで記録して自信に変える"
-            ]
-
-        else:
-            advice["運動"] = [
-                "医師や専門家に相談の上、安全な運動計画を立てる",
-                "プールでの水中運動や椅子体操など負荷の少ない活動を中心に",
-                "一度にたくさん運動するより、短時間を毎日続けることを意識"
-            ]
-            advice["食事"] = [
-                "栄養士の指導のもと1日の摂取カロリーを見直す",
-                "加工食品や外食の頻度を減らす",
-                "腹八分目で満足する訓練を意識する"
-            ]
-            advice["生活習慣"] = [
-                "健康記録アプリを使って摂取量や活動を記録",
-                "毎週決まった曜日に体重・体脂肪率をチェック",
-                "就寝時間を一定に保ち、睡眠時間を6時間以上確保"
-            ]
-            advice["メンタルヘルス"] = [
-                "短期的な結果に一喜一憂せず、長期視点で考える",
-                "体型の変化だけでなく、気分・体調の変化にも注目する",
-                "応援してくれる人を見つけ、感謝を共有する"
-            ]
-
-        return advice
+        return generate_lifestyle_advice(bmi, age, gender, rules=MHLW_ADVICE_RULES)
 
     def load_csv_data(self, file_path):
         try:
-            self.data = pd.read_csv(file_path, encoding='utf-8')
+            if isinstance(file_path, (str, os.PathLike)):
+                # ファイルパスは更新日時・サイズで識別し、列指向キャッシュから読み込む
+                stat = os.stat(file_path)
+                key = ("file", os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+                data = _dataset_cache.get(key)
+                if data is None:
+                    data = _dataset_cache.put(key, read_csv_cached(file_path, encoding='utf-8'))
+            else:
+                # アップロードされたファイルは内容のハッシュで識別する
+                content = file_path.getvalue() if hasattr(file_path, "getvalue") else file_path.read()
+                if isinstance(content, str):
+                    content = content.encode('utf-8')
+                key = ("upload", hashlib.sha256(content).hexdigest())
+                data = _dataset_cache.get(key)
+                if data is None:
+                    data = _dataset_cache.put(key, pd.read_csv(io.BytesIO(content), encoding='utf-8'))
+            self.data = data
+            self.cache_key = key
             return True
         except Exception as e:
             print(f"CSV読み込み失敗: {e}")
@@ -172,49 +494,62 @@ class MHLWDataProcessor:
         if self.data is None:
             print("データが読み込まれていません")
             return False
-        self.data = self.data.dropna()
+        if self.cache_key is None:
+            self.data = self.data.dropna()
+            return True
+
+        key = self.cache_key + ("dropna",)
+        data = _dataset_cache.get(key)
+        if data is None:
+            data = _dataset_cache.put(key, self.data.dropna())
+        self.data = data
+        self.cache_key = key
         return True
 
-    def plot_bmi_distribution(self):
-        plt.figure(figsize=(10, 6))
-        sns.histplot(data=self.data, x='BMI', bins=30)
-        plt.title('BMIの分布')
-        plt.xlabel('BMI')
-        plt.ylabel('頻度')
-        plt.savefig('bmi_distribution.png')
-        plt.close()
-
-    def plot_bmi_by_gender(self):
-        plt.figure(figsize=(12, 6))
-        sns.boxplot(data=self.data, x='性別', y='BMI')
-        plt.title('性別ごとのBMI分布')
-        plt.savefig('bmi_by_gender.png')
-        plt.close()
-
-    def plot_age_bmi_relation(self):
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(data=self.data, x='年齢', y='BMI', hue='性別', alpha=0.5)
-        plt.title('年齢とBMIの関係')
-        plt.savefig('age_bmi_relation.png')
-        plt.close()
+    def plot_bmi_distribution(self, output_dir="."):
+        _draw_bmi_distribution(self.data, os.path.join(output_dir, 'bmi_distribution.png'))
+
+    def plot_bmi_by_gender(self, output_dir="."):
+        _draw_bmi_by_gender(self.data, os.path.join(output_dir, 'bmi_by_gender.png'))
+
+    def plot_age_bmi_relation(self, output_dir="."):
+        _draw_age_bmi_relation(self.data, os.path.join(output_dir, 'age_bmi_relation.png'))
+
+    def render_report(self, output_dir=".", max_workers=None):
+        """3種類のグラフをまとめて出力する（データが前回と同じなら再描画しない）"""
+        return render_cohort_reports({None: self.data}, output_dir, max_workers=max_workers)[None]
 
     def generate_health_statistics(self):
-        stats = {
-            '全体': {
-                'BMI平均': self.data['BMI'].mean(),
-                'BMI中央値': self.data['BMI'].median(),
-                'BMI標準偏差': self.data['BMI'].std(),
-                '年齢平均': self.data['年齢'].mean(),
-            }
-        }
+        if self.cache_key is not None:
+            return _dataset_cache.memoize(self.cache_key, "health_statistics", self._compute_health_statistics)
+        return self._compute_health_statistics()
+
+    def _compute_health_statistics(self):
+        return compute_group_statistics(self.data, by="性別")
+
+    def generate_group_statistics(self, by, quantiles=None):
+        """任意のキーでグループ化した統計量を返す（読み込んだデータごとにキャッシュ）"""
+        def compute():
+            return compute_group_statistics(self.data, by=by, quantiles=quantiles)
+
+        if self.cache_key is not None:
+            name = ("group_statistics", by if isinstance(by, str) else tuple(by), tuple(quantiles or ()))
+            return _dataset_cache.memoize(self.cache_key, name, compute)
+        return compute()
+
+    def generate_chart_data(self, nbins=30, max_points=MAX_SCATTER_POINTS):
+        """グラフ描画用の集計済みデータを返す（読み込んだデータごとにキャッシュ）
 
-        for gender in self.data['性別'].unique():
-            gender_data = self.data[self.data['性別'] == gender]
-            stats[gender] = {
-                'BMI平均': gender_data['BMI'].mean(),
-                'BMI中央値': gender_data['BMI'].median(),
-                'BMI標準偏差': gender_data['BMI'].std(),
-                '年齢平均': gender_data['年齢'].mean(),
+        ヒストグラムのビン、性別ごとの箱ひげ図の統計量、間引いた散布図の点を返すため、
+        入力の行数に関わらずブラウザに送るデータ量は一定に収まる。
+        """
+        def compute():
+            return {
+                "histogram": histogram_summary(self.data["BMI"], nbins=nbins),
+                "box": box_summary(self.data, "性別", "BMI"),
+                "scatter": downsample_scatter(self.data, "年齢", "BMI", max_points=max_points),
             }
 
-        return stats
+        if self.cache_key is not None:
+            return _dataset_cache.memoize(self.cache_key, ("chart_data", nbins, max_points), compute)
+        return compute()
@@ -0,0 +1,288 @@
+# model_bundle.py
+"""疾病リスクモデルの成果物（バンドル）を保存・読み込みするモジュール
+
+バンドルはディレクトリで、マニフェスト（manifest.json）とバージョンごとのサブディレクトリからなる。
+サブディレクトリには非圧縮の .npy ファイルを置き、マニフェストが現在のサブディレクトリを指す。
+.npy は np.load(..., mmap_mode='r') でメモリマップして読み込むため、読み込みはほぼ一瞬で、
+同じバンドルを読み込んだ複数のプロセス（予測サービスや一括判定のワーカー）は
+OSのページキャッシュを共有する。
+マニフェストには特徴量の順序・学習データのハッシュ・変換元のモデルファイルのハッシュを記録し、
+古くなったバンドルを検出できるようにする。
+
+実行方法（リポジトリのルートで）:
+    python model_bundle.py build --training-data data/raw/medical_data.csv
+    python model_bundle.py check --training-data data/raw/medical_data.csv
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from file_utils import atomic_write_json
+from forest_export import CompiledForest, CompiledRiskModels
+from model_registry import DISEASES, FEATURES, MODEL_DIR, ModelRegistry, file_sha256
+
+BUNDLE_FORMAT_VERSION = 2
+BUNDLE_DIR = os.path.join(MODEL_DIR, "bundle")
+MANIFEST_FILE = "manifest.json"
+FOREST_ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+
+class StaleArtifactError(ValueError):
+    """バンドルが現在の特徴量・学習データ・モデルファイルと一致しない場合の例外"""
+
+
+def training_data_hash(X, y=None):
+    """学習データ（特徴量と正解ラベル）の内容のハッシュを返す関数"""
+    data = X if y is None else pd.concat([X, y], axis=1)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in data.columns], ensure_ascii=False).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def source_model_hashes(model_dir=MODEL_DIR, diseases=DISEASES):
+    """変換元のモデルファイル（joblib）のハッシュを返す関数"""
+    names = [f"{disease}_model.joblib" for disease in diseases] + ["scaler.joblib"]
+    return {
+        name: file_sha256(os.path.join(model_dir, name))
+        for name in names
+        if os.path.exists(os.path.join(model_dir, name))
+    }
+
+
+def _source_stats(model_dir, names):
+    """変換元のモデルファイルの (更新日時, サイズ) を返す関数"""
+    stats = {}
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(model_dir, name))
+        except FileNotFoundError:
+            continue
+        stats[name] = [stat.st_mtime_ns, stat.st_size]
+    return stats
+
+
+def current_source_hashes(manifest, model_dir):
+    """マニフェストに記録した変換元のモデルファイルの、現在のハッシュを返す関数
+
+    更新日時・サイズが記録と同じファイルは、記録済みのハッシュを使って再計算を省く。
+    削除されたファイルは結果に含まれない。
+    """
+    recorded = manifest.get("source_stats", {})
+    current = _source_stats(model_dir, manifest["sources"])
+    return {
+        name: manifest["sources"][name] if recorded.get(name) == stat else file_sha256(os.path.join(model_dir, name))
+        for name, stat in current.items()
+    }
+
+
+def _bundle_arrays(compiled):
+    arrays = {"scaler_mean.npy": compiled.mean, "scaler_scale.npy": compiled.scale}
+    for disease, forest in compiled.forests.items():
+        for name in FOREST_ARRAYS:
+            arrays[f"{disease}_{name}.npy"] = getattr(forest, name)
+    return arrays
+
+
+def _version_dir_name(version):
+    return f"v-{version}"
+
+
+def _remove_old_versions(bundle_dir, keep):
+    """keep に含まれないバージョンのサブディレクトリと、旧形式のバンドルのファイルを削除する"""
+    for name in os.listdir(bundle_dir):
+        if name == MANIFEST_FILE or name in keep or name.startswith("."):
+            continue  # "." で始まるものは他のプロセスが書き出し中の一時ファイル
+        path = os.path.join(bundle_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".npy"):
+            os.remove(path)
+
+
+def save_bundle(compiled, bundle_dir=BUNDLE_DIR, training_hash=None, sources=None, model_dir=None):
+    """変換済みのモデルをバンドルとして保存し、マニフェストを返す関数
+
+    sources は変換元のモデルファイルのハッシュ（source_model_hashes）。model_dir（既定はバンドルの
+    親ディレクトリ）にあるそれらのファイルの更新日時・サイズも記録し、読み込み時の確認に使う。
+
+    配列は内容から決まるバージョンのサブディレクトリに書き出し、最後にマニフェストを
+    os.replace で置き換えて切り替える。読み込み中のプロセスは常に切り替え前か後の
+    どちらかの完全なバンドルを読む。切り替え前のバージョンは、それを読み始めたばかりの
+    プロセスのために次の保存まで残す。
+    """
+    bundle_dir = os.path.abspath(bundle_dir)
+    os.makedirs(bundle_dir, exist_ok=True)
+    try:
+        previous = read_manifest(bundle_dir).get("directory")
+    except (OSError, ValueError):
+        previous = None
+
+    tmp_dir = tempfile.mkdtemp(dir=bundle_dir, prefix=".tmp-")
+    try:
+        # mkdtemp は所有者のみのアクセス権で作るため、他のプロセスからも読めるようにする
+        os.chmod(tmp_dir, 0o755)
+        files = {}
+        for filename, array in _bundle_arrays(compiled).items():
+            path = os.path.join(tmp_dir, filename)
+            np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+            files[filename] = {
+                "sha256": file_sha256(path),
+                "dtype": str(array.dtype),
+                "shape": list(array.shape),
+            }
+        version = hashlib.sha256(
+            "".join(files[name]["sha256"] for name in sorted(files)).encode()
+        ).hexdigest()[:12]
+        directory = _version_dir_name(version)
+
+        # 同じ内容のバージョンが既にあれば、書き出した配列は使わずにそれを指す
+        try:
+            os.rename(tmp_dir, os.path.join(bundle_dir, directory))
+        except OSError:
+            if not os.path.isdir(os.path.join(bundle_dir, directory)):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "version": version,
+            "directory": directory,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "features": list(compiled.features),
+            "diseases": list(compiled.forests),
+            "max_depth": {disease: forest.max_depth for disease, forest in compiled.forests.items()},
+            "value_scale": {disease: forest.value_scale for disease, forest in compiled.forests.items()},
+            "training_data_sha256": training_hash,
+            "sources": sources or {},
+            "source_stats": _source_stats(model_dir or os.path.dirname(bundle_dir), sources or {}),
+            "files": files,
+        }
+        atomic_write_json(os.path.join(bundle_dir, MANIFEST_FILE), manifest, mode=0o644)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _remove_old_versions(bundle_dir, keep={directory, previous})
+    return manifest
+
+
+def read_manifest(bundle_dir=BUNDLE_DIR):
+    with open(os.path.join(bundle_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_manifest(manifest, features=FEATURES, training_hash=None, sources=None):
+    """マニフェストが現在の特徴量・学習データ・モデルファイルと一致するか確認する関数
+
+    一致しない場合は StaleArtifactError を送出する。training_hash・sources が None の項目は確認しない。
+    マニフェストに記録した変換元のモデルファイルが sources に無い（削除された）場合も古いとみなす。
+    """
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise StaleArtifactError(f"対応していないバンドル形式です: {manifest.get('format_version')}")
+    if list(manifest["features"]) != list(features):
+        raise StaleArtifactError(f"特徴量の順序が一致しません: {manifest['features']}")
+    if training_hash is not None and manifest.get("training_data_sha256") != training_hash:
+        raise StaleArtifactError("バンドル作成後に学習データが変更されています")
+    if sources is not None:
+        names = sorted(set(manifest["sources"]) | set(sources))
+        changed = [name for name in names if manifest["sources"].get(name) != sources.get(name)]
+        if changed:
+            raise StaleArtifactError(f"バンドル作成後にモデルファイルが更新・削除されています: {', '.join(changed)}")
+
+
+def _load_arrays(bundle_dir, manifest, mmap_mode):
+    version_dir = os.path.join(bundle_dir, manifest["directory"])
+
+    def load(filename):
+        return np.load(os.path.join(version_dir, filename), mmap_mode=mmap_mode, allow_pickle=False)
+
+    forests = {
+        disease: CompiledForest(
+            max_depth=manifest["max_depth"][disease],
+            value_scale=manifest["value_scale"][disease],
+            **{name: load(f"{disease}_{name}.npy") for name in FOREST_ARRAYS},
+        )
+        for disease in manifest["diseases"]
+    }
+    return CompiledRiskModels(load("scaler_mean.npy"), load("scaler_scale.npy"), forests, manifest["features"])
+
+
+def load_bundle(bundle_dir=BUNDLE_DIR, mmap_mode="r", features=FEATURES, training_hash=None, sources=None,
+                model_dir=None, attempts=3):
+    """バンドルを読み込み、(予測器, マニフェスト) を返す関数
+
+    mmap_mode='r' では配列をメモリマップで読み込む（読み取り専用）。
+    sources を省略すると model_dir（既定はバンドルの親ディレクトリ）にある変換元のモデルファイルの
+    ハッシュと比べるため、バンドル作成後にモデルを学習し直した場合は StaleArtifactError になる。
+    training_hash を渡した場合は学習データのハッシュも確認する。
+    読み込み中に保存が続いて古いバージョンが削除された場合は、マニフェストを読み直す。
+    """
+    if sources is None:
+        model_dir = model_dir or os.path.dirname(os.path.abspath(bundle_dir))
+    for attempt in range(attempts):
+        manifest = read_manifest(bundle_dir)
+        check_manifest(
+            manifest,
+            features=features,
+            training_hash=training_hash,
+            sources=sources if sources is not None else current_source_hashes(manifest, model_dir),
+        )
+        try:
+            return _load_arrays(bundle_dir, manifest, mmap_mode), manifest
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+
+
+def build_bundle(model_dir=MODEL_DIR, bundle_dir=BUNDLE_DIR, training_hash=None, diseases=DISEASES):
+    """model_dir の学習済みモデル（joblib）からバンドルを作る関数"""
+    registry = ModelRegistry(model_dir=model_dir, measure_memory=False)
+    models, scaler = registry.get_disease_models(diseases)
+    compiled = CompiledRiskModels.from_sklearn(models, scaler)
+    return save_bundle(compiled, bundle_dir, training_hash, source_model_hashes(model_dir, diseases), model_dir)
+
+
+def _training_hash_from_file(path):
+    # data_processor は save_models でこのモジュールを使うため、循環しないよう実行時に読み込む
+    from data_processor import TARGETS, load_and_process_data
+
+    X, y = load_and_process_data(path)
+    return training_data_hash(X, y[TARGETS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--bundle-dir", default=BUNDLE_DIR)
+    parser.add_argument("--training-data", default=None, help="学習に使った医療データのCSV")
+    args = parser.parse_args()
+
+    training_hash = _training_hash_from_file(args.training_data) if args.training_data else None
+    if args.command == "build":
+        manifest = build_bundle(args.model_dir, args.bundle_dir, training_hash)
+        print(f"バンドルを作成しました: {args.bundle_dir}（バージョン {manifest['version']}）")
+        return 0
+
+    try:
+        _, manifest = load_bundle(
+            args.bundle_dir, training_hash=training_hash, sources=source_model_hashes(args.model_dir)
+        )
+    except StaleArtifactError as e:
+        print(f"バンドルが古くなっています: {e}")
+        return 1
+    print(f"バンドルは最新です（バージョン {manifest['version']}, 作成日時 {manifest['created_at']}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
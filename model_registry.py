@@ -0,0 +1,193 @@
+# model_registry.py
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+import joblib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LEGACY_MODEL_PATH = os.path.join(BASE_DIR, "model.pkl")
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+DISEASES = ("糖尿病", "高血圧", "心臓病")
+# 疾病モデルの特徴量（この順序でスケーラー・モデルに渡す）
+FEATURES = [
+    '年齢', '性別', 'BMI', '血圧_最高', '血圧_最低',
+    '運動頻度', '喫煙', '飲酒', '睡眠時間'
+]
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """ファイルのSHA-256ハッシュを計算する関数"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _ByteCounter:
+    """書き込まれたバイト数だけを数えるファイル風オブジェクト"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def estimate_memory_bytes(obj):
+    """オブジェクトのメモリ使用量をpickle化したサイズで近似する関数
+
+    sklearnの決定木はノード配列をC側で確保するため、tracemallocでは計測できない。
+    """
+    counter = _ByteCounter()
+    pickle.dump(obj, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+
+class _Artifact:
+    """読み込み済みモデルファイル1件分の状態"""
+
+    def __init__(self, path):
+        self.path = path
+        self.obj = None
+        self.stat_key = None
+        self.sha256 = None
+        self.load_seconds = None
+        self.memory_bytes = None
+        self.loaded_at = None
+        self.load_count = 0
+
+
+class ModelRegistry:
+    """モデルファイルをプロセス内で一度だけ読み込み、共有するレジストリ
+
+    ファイルの更新日時・サイズが変わった場合のみハッシュを再計算し、
+    内容が変わっていれば自動的に読み込み直す。
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, legacy_model_path=LEGACY_MODEL_PATH, measure_memory=True):
+        self.model_dir = model_dir
+        self.legacy_model_path = legacy_model_path
+        self.measure_memory = measure_memory
+        self._artifacts = {}
+        self._lock = threading.RLock()
+
+    def _load(self, artifact, stat_key, sha256, loader, measure_memory):
+        """ファイルを読み込み、読み込み時間とメモリ使用量を記録する"""
+        start = time.perf_counter()
+        obj = loader(artifact.path)
+        elapsed = time.perf_counter() - start
+        memory_bytes = estimate_memory_bytes(obj) if measure_memory else None
+
+        artifact.obj = obj
+        artifact.stat_key = stat_key
+        artifact.sha256 = sha256
+        artifact.load_seconds = elapsed
+        artifact.memory_bytes = memory_bytes
+        artifact.loaded_at = time.time()
+        artifact.load_count += 1
+
+    def get(self, path, loader=joblib.load, measure_memory=None):
+        """指定パスのモデルを取得する（必要な場合のみ再読み込み）
+
+        loader は読み込みに使う関数（既定は joblib.load）。
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            artifact = self._artifacts.get(path)
+            if artifact is None:
+                artifact = _Artifact(path)
+                self._artifacts[path] = artifact
+
+            if artifact.stat_key != stat_key:
+                # 更新日時が変わっても内容が同じなら読み込み直さない
+                sha256 = file_sha256(path)
+                if artifact.obj is None or sha256 != artifact.sha256:
+                    if measure_memory is None:
+                        measure_memory = self.measure_memory
+                    self._load(artifact, stat_key, sha256, loader, measure_memory)
+                else:
+                    artifact.stat_key = stat_key
+
+            return artifact.obj
+
+    def get_legacy_model(self):
+        """model.pkl（身長・体重・年齢のロジスティック回帰）を取得する"""
+        return self.get(self.legacy_model_path)
+
+    def get_scaler(self):
+        """疾病モデル用のスケーラーを取得する"""
+        return self.get(os.path.join(self.model_dir, "scaler.joblib"))
+
+    def get_disease_models(self, diseases=DISEASES):
+        """疾病ごとのモデルとスケーラーを取得する"""
+        models = {
+            disease: self.get(os.path.join(self.model_dir, f"{disease}_model.joblib"))
+            for disease in diseases
+        }
+        return models, self.get_scaler()
+
+    def get_bundle(self, bundle_dir=None, training_hash=None):
+        """メモリマップで読み込んだモデルのバンドル（model_bundle.py）を取得する
+
+        戻り値は (予測器, マニフェスト)。マニフェストが置き換わった場合のみ読み込み直す。
+        読み込み時に model_dir のモデルファイル（と training_hash を渡した場合は学習データ）と
+        一致するか確認し、古いバンドルなら StaleArtifactError を送出する。
+        配列はプロセス間で共有されるため、メモリ使用量は計測しない。
+        """
+        # model_bundle はこのモジュールを使うため、循環しないよう実行時に読み込む
+        from model_bundle import MANIFEST_FILE, load_bundle
+
+        bundle_dir = bundle_dir or os.path.join(self.model_dir, "bundle")
+        return self.get(
+            os.path.join(bundle_dir, MANIFEST_FILE),
+            loader=lambda path: load_bundle(
+                os.path.dirname(path), training_hash=training_hash, model_dir=self.model_dir
+            ),
+            measure_memory=False,
+        )
+
+    def version(self, path):
+        """読み込み済みモデルのバージョン（ハッシュ先頭12桁）を返す"""
+        artifact = self._artifacts.get(os.path.abspath(path))
+        if artifact is None or artifact.sha256 is None:
+            return None
+        return artifact.sha256[:12]
+
+    def metrics(self):
+        """読み込み時間・メモリ使用量などの指標を返す"""
+        with self._lock:
+            return {
+                os.path.relpath(path, BASE_DIR): {
+                    "sha256": artifact.sha256,
+                    "file_bytes": artifact.stat_key[1] if artifact.stat_key else None,
+                    "load_seconds": artifact.load_seconds,
+                    "memory_bytes": artifact.memory_bytes,
+                    "loaded_at": artifact.loaded_at,
+                    "load_count": artifact.load_count,
+                }
+                for path, artifact in self._artifacts.items()
+            }
+
+    def total_memory_bytes(self):
+        """読み込み済みモデルのメモリ使用量の合計を返す"""
+        return sum(m["memory_bytes"] or 0 for m in self.metrics().values())
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """プロセス全体で共有するモデルレジストリを取得する関数"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,118 @@
+# password_hashing.py
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import bcrypt
+except ImportError:  # config.yaml のbcryptハッシュを検証する場合のみ必要
+    bcrypt = None
+
+# scryptのコスト（N = 2 ** PASSWORD_HASH_COST）。環境変数で調整できる
+PASSWORD_HASH_COST = int(os.environ.get("PASSWORD_HASH_COST", "14"))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+# パスワード検証を行うスレッド数の上限
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+SCHEME = "scrypt"
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password, salt, cost, r, p):
+    n = 2 ** cost
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r, dklen=KEY_BYTES,
+    )
+
+
+def hash_password(password, cost=None):
+    """パスワードをscryptでハッシュ化する関数
+
+    形式は「scrypt$コスト$r$p$ソルト$ハッシュ」（ソルトとハッシュはBase64）。
+    """
+    cost = PASSWORD_HASH_COST if cost is None else cost
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, cost, SCRYPT_R, SCRYPT_P)
+    return f"{SCHEME}${cost}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def is_legacy_hash(stored):
+    """ソルト無しSHA-256（旧形式）のハッシュかどうかを返す関数"""
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+
+def needs_rehash(stored, cost=None):
+    """現在の設定でハッシュし直すべきかを返す関数"""
+    cost = PASSWORD_HASH_COST if cost is None else cost
+    if not stored.startswith(SCHEME + "$"):
+        return True
+    return int(stored.split("$")[1]) < cost
+
+
+def verify_password(password, stored):
+    """パスワードが保存済みのハッシュと一致するかを返す関数（旧形式・bcryptにも対応）"""
+    if stored.startswith(SCHEME + "$"):
+        _, cost, r, p, salt, expected = stored.split("$")
+        key = _scrypt(password, base64.b64decode(salt), int(cost), int(r), int(p))
+        return hmac.compare_digest(key, base64.b64decode(expected))
+    if stored.startswith(("$2a$", "$2b$", "$2y$")):
+        if bcrypt is None:
+            print("bcryptがインストールされていないため、bcryptハッシュを検証できません")
+            return False
+        return bcrypt.checkpw(password.encode("utf-8"), stored.encode("ascii"))
+    if is_legacy_hash(stored):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+    return False
+
+
+def verify_and_upgrade(password, stored):
+    """パスワードを検証し、必要なら新しいハッシュも作る関数
+
+    戻り値は (一致したか, 新しいハッシュ)。ハッシュし直す必要が無い場合、
+    新しいハッシュは None になる。
+    """
+    if not verify_password(password, stored):
+        return False, None
+    if needs_rehash(stored):
+        return True, hash_password(password)
+    return True, None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_password_executor():
+    """パスワード処理用のスレッドプールを取得する関数
+
+    scryptはGILを解放して計算するため、スレッドプールで実行すれば他のセッションの
+    処理を止めずに済む。同時に走る計算の数は PASSWORD_HASH_WORKERS に制限する。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+            )
+        return _executor
+
+
+def verify_and_upgrade_in_pool(password, stored, timeout=None):
+    """スレッドプールで verify_and_upgrade を実行し、結果を待つ関数"""
+    return get_password_executor().submit(verify_and_upgrade, password, stored).result(timeout)
+
+
+def hash_password_in_pool(password, timeout=None):
+    """スレッドプールで hash_password を実行し、結果を待つ関数"""
+    return get_password_executor().submit(hash_password, password).result(timeout)
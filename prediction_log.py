@@ -0,0 +1,209 @@
+# prediction_log.py
+import atexit
+import csv
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from file_utils import atomic_write_json, file_lock
+from model_registry import file_sha256
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREDICTION_LOG_FILE = os.path.join(BASE_DIR, "logs", "predictions.jsonl")
+LEGACY_PREDICTION_LOG = os.path.join(BASE_DIR, "予測ログ.csv")
+# 旧予測ログの変換が完了したことを記録するファイル
+LEGACY_CONVERTED_MARKER = os.path.join(BASE_DIR, "logs", "legacy_prediction_log_converted.json")
+SCHEMA_VERSION = 1
+
+
+def make_prediction_record(model, model_version, inputs, probabilities, latency_ms, prediction=None):
+    """予測ログ1件分のレコードを作る関数
+
+    inputs は入力値の辞書、probabilities は疾病（またはクラス）ごとの確率の辞書。
+    """
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+        "model": model,
+        "model_version": model_version,
+        "inputs": inputs,
+        "probabilities": probabilities,
+        "prediction": prediction,
+        "latency_ms": latency_ms,
+    }
+
+
+class PredictionLogger:
+    """予測ログをメモリ上のリングバッファに溜め、バックグラウンドでまとめて書き出すロガー
+
+    log() はバッファに追加するだけでディスクI/Oを行わない。書き出し用のスレッドが
+    flush_interval 秒ごと、または batch_size 件溜まった時点でJSON Lines形式で追記する。
+    ファイルが max_bytes を超えるか、ファイルの先頭のレコードから rotate_interval 秒経過すると
+    ローテーションし、古いファイルは backup_count 個まで残す。経過時間はファイルの内容で判断するため、
+    アプリを再起動しても途切れない。バッファが満杯のときは古いレコードから捨てる。
+    """
+
+    def __init__(self, path=PREDICTION_LOG_FILE, buffer_size=10000, batch_size=500,
+                 flush_interval=1.0, max_bytes=50 * 1024 * 1024, rotate_interval=24 * 60 * 60,
+                 backup_count=14):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.dropped = 0
+        self.written = 0
+
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._started_at = None
+        self._started_at_key = None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record):
+        """レコードをバッファに追加する（ディスクには書き込まない）"""
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """バッファの内容をファイルに書き出す"""
+        with self._write_lock:
+            with self._lock:
+                records = list(self._buffer)
+                self._buffer.clear()
+            if not records:
+                return 0
+
+            data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+            encoded = data.encode("utf-8")
+            self._rotate_if_needed(len(encoded))
+            with open(self.path, "ab") as f:
+                f.write(encoded)
+            self.written += len(records)
+            return len(records)
+
+    def close(self):
+        """書き出し用スレッドを止め、残りのレコードを書き出す"""
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"予測ログの書き込みに失敗しました: {e}")
+
+    def _file_started_at(self, stat):
+        """ログファイルの先頭のレコードの時刻を返す（読めない場合はファイルの更新日時）"""
+        key = (stat.st_dev, stat.st_ino)
+        if self._started_at_key != key:
+            # 他のプロセスがローテーションした場合もファイルが変わるため、その時だけ読み直す
+            started_at = stat.st_mtime
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    started_at = datetime.fromisoformat(json.loads(f.readline())["timestamp"]).timestamp()
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+            self._started_at = started_at
+            self._started_at_key = key
+        return self._started_at
+
+    def _rotate_if_needed(self, incoming_bytes):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        size = stat.st_size
+        expired = size and time.time() - self._file_started_at(stat) >= self.rotate_interval
+        if size and (size + incoming_bytes > self.max_bytes or expired):
+            stem, ext = os.path.splitext(self.path)
+            rotated = f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+            os.replace(self.path, rotated)
+            for old in sorted(glob.glob(f"{stem}-*{ext}"))[:-self.backup_count or None]:
+                os.remove(old)
+
+
+def convert_legacy_log(logger, csv_path=LEGACY_PREDICTION_LOG, marker_path=LEGACY_CONVERTED_MARKER):
+    """ヘッダー無しの旧予測ログ（予測ログ.csv）を新しい形式に変換して書き出す関数
+
+    旧ログの列は 日時, 身長, 体重, 年齢, クラス, 確率。
+    変換が終わると旧ログのハッシュを marker_path に記録し、同じ内容の旧ログは2回目以降変換しない。
+    戻り値は変換した件数（変換済みの場合は0）。
+    """
+    os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+    with file_lock(marker_path):
+        sha256 = file_sha256(csv_path)
+        try:
+            with open(marker_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("sha256") == sha256:
+                    print(f"旧予測ログは変換済みです: {csv_path}")
+                    return 0
+        except (OSError, ValueError):
+            pass
+
+        count = 0
+        with open(csv_path, "r", encoding="utf-8") as f:
+            for timestamp, height, weight, age, predicted, probability in csv.reader(f):
+                record = make_prediction_record(
+                    model="model.pkl",
+                    model_version=None,
+                    inputs={"height": float(height), "weight": float(weight), "age": int(age)},
+                    probabilities={"1": float(probability)},
+                    latency_ms=None,
+                    prediction=int(predicted),
+                )
+                record["timestamp"] = timestamp
+                logger.log(record)
+                count += 1
+                if count % logger.batch_size == 0:
+                    logger.flush()  # バッファがあふれて捨てられないよう、こまめに書き出す
+        logger.flush()
+
+        atomic_write_json(marker_path, {
+            "source": os.path.abspath(csv_path),
+            "sha256": sha256,
+            "records": count,
+            "converted_at": datetime.now().isoformat(timespec="seconds"),
+        })
+    return count
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_prediction_logger():
+    """プロセス全体で共有する予測ロガーを取得する関数"""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = PredictionLogger()
+        return _logger
+
+
+if __name__ == "__main__":
+    converted = convert_legacy_log(get_prediction_logger())
+    print(f"{converted}件の予測ログを変換しました。")
@@ -0,0 +1,264 @@
+# score_cohort.py
+"""健診データのCSVを一括で判定し、結果を列に追加して書き出すコマンド
+
+各行についてBMI（無ければ身長・体重から計算）、BMI判定、健康リスク（calculate_health_risks と同じ値）、
+学習済みモデル（models/*_model.joblib）による疾病ごとの予測確率を求める。
+入力はチャンク単位で読み込み、複数のプロセスで並列に判定して、入力と同じ順序で書き出す。
+
+実行方法（リポジトリのルートで）:
+    python score_cohort.py data/raw/medical_data.csv -o scored.parquet
+    python score_cohort.py data/raw/sample_health_data.csv -o scored.csv --workers 4
+    cat checkup.csv | python score_cohort.py - -o - > scored.csv
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquetで書き出す場合のみ必要
+    pa = None
+    pq = None
+
+from data_processor import FEATURES, MEDICAL_DATA_DTYPES, predict_risks_batch
+from health_assessment import DISEASES, bmi_status_labels, calculate_bmi_status_batch, calculate_health_risks_batch
+from model_bundle import StaleArtifactError, load_bundle
+from model_registry import MODEL_DIR, ModelRegistry
+
+DEFAULT_CHUNKSIZE = 100_000
+# 整数列は欠損のある行があっても読み込めるよう、欠損値を扱える整数型にする。
+# 性別はカテゴリ型にすると未知の値が欠損値になってしまうため、元の値のまま文字列で読み込む
+SCORING_DTYPES = {
+    column: ('string' if not isinstance(dtype, str) else dtype.capitalize() if dtype.startswith('int') else dtype)
+    for column, dtype in MEDICAL_DATA_DTYPES.items()
+}
+GENDERS = ('男性', '女性')
+
+STATUS_COLUMN = 'BMI判定'
+RISK_COLUMNS = [f'リスク_{disease}' for disease in DISEASES]
+PREDICTION_COLUMNS = [f'予測確率_{disease}' for disease in DISEASES]
+
+# ワーカープロセスごとに1回だけ読み込むモデル
+_models = None
+_scaler = None
+_compiled = None
+
+
+def _init_worker(model_dir, bundle_dir=None):
+    """ワーカープロセスの初期化（モデルとスケーラー、またはバンドルを読み込む）
+
+    バンドルはメモリマップで読み込むため、全てのワーカーで同じページを共有する。
+    バンドルが model_dir のモデルファイルより古い場合は StaleArtifactError になる。
+    """
+    global _models, _scaler, _compiled
+    if bundle_dir is not None:
+        _compiled, _ = load_bundle(bundle_dir, model_dir=model_dir)
+    elif model_dir is not None:
+        registry = ModelRegistry(model_dir=model_dir, measure_memory=False)
+        _models, _scaler = registry.get_disease_models(DISEASES)
+
+
+def score_chunk(df):
+    """1チャンク分の行を判定し、結果の列を追加したDataFrameを返す関数"""
+    # BMIが無い（または欠損している）行は身長・体重から計算する
+    if {'身長', '体重'} <= set(df.columns):
+        computed = df['体重'] / ((df['身長'] / 100) ** 2)
+        df['BMI'] = df['BMI'].fillna(computed) if 'BMI' in df.columns else computed
+
+    bmi = df['BMI'].to_numpy(dtype='float64', na_value=np.nan)
+    age = df['年齢'].to_numpy(dtype='float64', na_value=np.nan)
+    codes, _ = calculate_bmi_status_batch(bmi, age)
+    df[STATUS_COLUMN] = bmi_status_labels(codes)
+
+    # 性別が欠損・未知の値の行は判定できないため、リスクと予測確率を欠損値にする
+    gender = df['性別']
+    valid_gender = gender.isin(GENDERS).to_numpy(dtype=bool)
+    risks = np.full((len(df), len(DISEASES)), np.nan)
+    if valid_gender.any():
+        risks[valid_gender] = calculate_health_risks_batch(
+            bmi[valid_gender], age[valid_gender], gender[valid_gender].to_numpy(dtype=object)
+        )
+    df[RISK_COLUMNS] = risks
+
+    if (_models is not None or _compiled is not None) and set(FEATURES) <= set(df.columns):
+        # 性別を数値に変換（女性=0, 男性=1。未知の値は欠損値）
+        is_male = gender.eq('男性').fillna(False).to_numpy(dtype=bool)
+        sex = np.where(valid_gender, is_male.astype('float64'), np.nan)
+        features = df[FEATURES].assign(性別=sex).astype('float64')
+        valid = features.notna().all(axis=1).to_numpy()
+        probabilities = np.full((len(df), len(DISEASES)), np.nan)
+        if valid.any() and _compiled is not None:
+            predicted = _compiled.predict_proba(features[valid])
+            probabilities[valid] = predicted[:, [list(_compiled.forests).index(d) for d in DISEASES]]
+        elif valid.any():
+            predicted = predict_risks_batch(_models, _scaler, features[valid])
+            probabilities[valid] = predicted[list(DISEASES)].to_numpy()
+        df[PREDICTION_COLUMNS] = probabilities
+    return df
+
+
+def _pinned_dtype(column):
+    """SCORING_DTYPES に無い列の型を、最初のチャンクで推定された型から決める関数
+
+    チャンクごとに型を推定すると、空欄のあるチャンクだけ整数列が浮動小数点になるなど
+    型が変わり、Parquetのスキーマと一致しなくなるため、欠損値を扱える型にそろえる。
+    """
+    if pd.api.types.is_bool_dtype(column):
+        return 'boolean'
+    if pd.api.types.is_integer_dtype(column):
+        return 'Int64'
+    if pd.api.types.is_float_dtype(column) and column.notna().any():
+        return 'float64'
+    # 文字列の列と、最初のチャンクでは全て空欄だった列
+    return 'string'
+
+
+def read_chunks(source, chunksize):
+    """入力CSVをチャンク単位で読み込むジェネレーター（source が "-" なら標準入力）
+
+    SCORING_DTYPES に無い列は、最初のチャンクで決めた型に全てのチャンクをそろえる。
+    """
+    source = sys.stdin if source == '-' else source
+    reader = pd.read_csv(source, chunksize=chunksize, dtype=SCORING_DTYPES)
+    dtypes = None
+    for chunk in reader:
+        if dtypes is None:
+            dtypes = {
+                column: _pinned_dtype(chunk[column])
+                for column in chunk.columns
+                if column not in SCORING_DTYPES
+            }
+        yield chunk.astype(dtypes).reset_index(drop=True)
+
+
+def map_ordered(executor, func, chunks, max_pending):
+    """チャンクを順に並列処理し、入力と同じ順序で結果を返すジェネレーター
+
+    処理待ちのチャンクを max_pending 個までに抑えるため、入力全体をメモリに読み込まない。
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(func, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class ScoredWriter:
+    """判定結果をチャンク単位でCSVまたはParquetに書き出すクラス"""
+
+    def __init__(self, output, output_format):
+        self.output = output
+        self.output_format = output_format
+        self.rows = 0
+        self._file = None
+        self._parquet = None
+
+    def write(self, df):
+        if self.output_format == 'parquet':
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.output, table.schema)
+            self._parquet.write_table(table)
+        else:
+            if self._file is None:
+                self._file = sys.stdout if self.output == '-' else open(self.output, 'w', encoding='utf-8', newline='')
+                header = True
+            else:
+                header = False
+            df.to_csv(self._file, header=header, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+
+
+def score_file(source, output, output_format='csv', chunksize=DEFAULT_CHUNKSIZE, workers=None, model_dir=MODEL_DIR,
+               bundle_dir=None):
+    """入力ファイルを判定して書き出し、(書き出した行数, 性別が不正で判定できなかった行数) を返す関数
+
+    workers はワーカープロセス数（既定はCPUコア数、1ならこのプロセスで逐次処理）。
+    bundle_dir を指定すると、joblibのモデルの代わりにバンドル（model_bundle.py）で予測する。
+    model_dir が None、またはモデルが見つからない場合は予測確率の列を出力しない。
+    """
+    if bundle_dir is None and model_dir is not None and not os.path.exists(os.path.join(model_dir, 'scaler.joblib')):
+        print(f"モデルが見つからないため、予測確率は出力しません: {model_dir}", file=sys.stderr)
+        model_dir = None
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if bundle_dir is not None and workers > 1:
+        # ワーカーの初期化で失敗するとプール全体が止まるため、古いバンドルでないか先に確認する
+        load_bundle(bundle_dir, model_dir=model_dir)
+
+    chunks = read_chunks(source, chunksize)
+    writer = ScoredWriter(output, output_format)
+    invalid_gender = 0
+    try:
+        if workers <= 1:
+            _init_worker(model_dir, bundle_dir)
+            for scored in map(score_chunk, chunks):
+                invalid_gender += int((~scored['性別'].isin(GENDERS)).sum())
+                writer.write(scored)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(model_dir, bundle_dir)
+            ) as executor:
+                for scored in map_ordered(executor, score_chunk, chunks, max_pending=workers * 2):
+                    invalid_gender += int((~scored['性別'].isin(GENDERS)).sum())
+                    writer.write(scored)
+    finally:
+        writer.close()
+    return writer.rows, invalid_gender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='入力CSVのパス（"-" なら標準入力）')
+    parser.add_argument('-o', '--output', required=True, help='出力先（.parquet ならParquet、"-" なら標準出力にCSV）')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None, help='出力形式（既定は拡張子から判断）')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='1チャンクの行数')
+    parser.add_argument('--workers', type=int, default=None, help='ワーカープロセス数')
+    parser.add_argument('--model-dir', default=MODEL_DIR, help='学習済みモデルのディレクトリ')
+    parser.add_argument('--bundle', default=None, help='予測に使うモデルのバンドル（model_bundle.py で作成）')
+    parser.add_argument('--no-models', action='store_true', help='学習済みモデルによる予測を行わない')
+    args = parser.parse_args()
+
+    output_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    if output_format == 'parquet' and (pq is None or args.output == '-'):
+        parser.error('Parquetで出力するには pyarrow と出力ファイルのパスが必要です')
+
+    start = time.perf_counter()
+    try:
+        rows, invalid_gender = score_file(
+            args.input, args.output, output_format,
+            chunksize=args.chunksize,
+            workers=args.workers,
+            model_dir=None if args.no_models else args.model_dir,
+            bundle_dir=None if args.no_models else args.bundle,
+        )
+    except StaleArtifactError as e:
+        print(f"バンドルが古くなっています（model_bundle.py build で作り直してください）: {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"{rows:,}行を判定しました（{elapsed:.1f}秒, {rows / max(elapsed, 1e-9):,.0f}行/秒）", file=sys.stderr)
+    if invalid_gender:
+        print(
+            f"性別が空欄または「男性」「女性」以外の{invalid_gender:,}行は、リスクと予測確率を空欄にしました",
+            file=sys.stderr,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+# scoring_service.py
+"""健康リスク判定のHTTPサービス（標準ライブラリのasyncioのみで動作）
+
+POST /predict に1人分の入力をJSONで送ると、学習済みモデルによる疾病ごとの予測確率
+（data_processor.predict_risks と同じ値）と、calculate_health_risks による健康リスクを返す。
+同時に届いたリクエストは batch_window 秒だけ待ってまとめ、predict_proba を1回で呼び出す。
+モデルのバンドル（models/bundle、model_bundle.py で作成）があればメモリマップで読み込んで使い、
+同じバンドルを使う他のプロセスとページを共有する。バンドルが無いか古い場合は joblib のモデルを使う。
+
+入力例:
+    {"年齢": 45, "性別": "男性", "身長": 170, "体重": 72, "血圧_最高": 130, "血圧_最低": 85,
+     "運動頻度": 2, "喫煙": 0, "飲酒": 1, "睡眠時間": 6.5}
+（BMI を省略した場合は身長・体重から計算する）
+
+実行方法（リポジトリのルートで）:
+    python scoring_service.py --port 8000 --batch-window-ms 5
+    curl -X POST localhost:8000/predict -d '{"年齢": 45, ...}'
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from data_processor import FEATURES, predict_risks_batch
+from health_assessment import DISEASES, calculate_health_risks
+from latency_metrics import get_latency_metrics
+from model_bundle import MANIFEST_FILE, StaleArtifactError
+from model_registry import MODEL_DIR, get_model_registry
+from prediction_log import get_prediction_logger, make_prediction_record
+
+DEFAULT_BATCH_WINDOW = 0.005
+DEFAULT_MAX_BATCH_SIZE = 256
+MAX_BODY_BYTES = 64 * 1024
+GENDER_CODES = {"男性": 1, "女性": 0, 1: 1, 0: 0}
+
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class RequestError(Exception):
+    """クライアントの入力の誤り（HTTPステータスとメッセージを持つ）"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _derive_bmi(values):
+    """BMIが省略されていれば身長・体重から計算して values に設定する関数"""
+    if values.get("BMI") is None and "身長" in values and "体重" in values:
+        try:
+            values["BMI"] = float(values["体重"]) / ((float(values["身長"]) / 100) ** 2)
+        except (TypeError, ValueError, ZeroDivisionError):
+            raise RequestError(400, "身長・体重は正の数値で指定してください")
+
+
+def parse_features(payload):
+    """リクエストのJSONを特徴量の配列（FEATURES の順）に変換する関数"""
+    if not isinstance(payload, dict):
+        raise RequestError(400, "JSONオブジェクトを送信してください")
+    values = dict(payload)
+    _derive_bmi(values)
+
+    missing = [feature for feature in FEATURES if values.get(feature) is None]
+    if missing:
+        raise RequestError(400, f"必須項目がありません: {', '.join(missing)}")
+    if values["性別"] not in GENDER_CODES:
+        raise RequestError(400, "性別は「男性」または「女性」で指定してください")
+
+    row = []
+    for feature in FEATURES:
+        value = GENDER_CODES[values[feature]] if feature == "性別" else values[feature]
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise RequestError(400, f"{feature}は数値で指定してください")
+        if not math.isfinite(value):
+            raise RequestError(400, f"{feature}は有限の数値で指定してください")
+        row.append(value)
+    return row, values
+
+
+async def read_request_head(reader):
+    """リクエスト行とヘッダーを読み込み、(メソッド, パス, ヘッダー) を返す関数
+
+    接続が閉じられた場合やリクエスト行が不正な場合は None を返す。
+    行が StreamReader の上限より長い場合は ValueError になる。
+    """
+    request_line = await reader.readline()
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return method, target.split("?", 1)[0], headers
+
+
+def content_length(headers):
+    """Content-Length ヘッダーを検証して本文のバイト数を返す関数"""
+    value = headers.get("content-length", "0")
+    if not value.isdecimal():
+        raise RequestError(400, "Content-Length が不正です")
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, "リクエストが大きすぎます")
+    return length
+
+
+class MicroBatcher:
+    """同時に届いた予測リクエストをまとめて処理するクラス
+
+    最初のリクエストが届いてから batch_window 秒（または max_batch_size 件に達するまで）待ち、
+    集まった行をまとめて predict_risks_batch に渡す。予測はスレッドで実行するため、
+    その間もイベントループは次のリクエストを受け付けられる。
+    """
+
+    def __init__(self, batch_window=DEFAULT_BATCH_WINDOW, max_batch_size=DEFAULT_MAX_BATCH_SIZE, model_dir=MODEL_DIR,
+                 bundle_dir=None):
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.model_dir = model_dir
+        self.bundle_dir = bundle_dir or os.path.join(model_dir, "bundle")
+        self.batches = 0
+        self.rows = 0
+        self.model_source = None
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._stale_manifest = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, row):
+        """1行分の特徴量を予測キューに入れ、(疾病ごとの確率, バージョン) を待つ"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # 待っている間に届いた分は待たずにまとめる
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def _get_bundle(self, registry):
+        """バンドルの (予測器, マニフェスト) を返す（バンドルが無いか古い場合は None）"""
+        manifest_path = os.path.join(self.bundle_dir, MANIFEST_FILE)
+        try:
+            stat = os.stat(manifest_path)
+        except FileNotFoundError:
+            return None
+        # 古いバンドルの確認ではモデルファイルのハッシュを計算し直すため、
+        # マニフェストが置き換わるまでは確認し直さない
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stale_manifest:
+            return None
+        try:
+            return registry.get_bundle(self.bundle_dir)
+        except FileNotFoundError:
+            return None
+        except StaleArtifactError as e:
+            print(f"バンドルが古いため、joblibのモデルで予測します: {e}", flush=True)
+            self._stale_manifest = stat_key
+            return None
+
+    def load_models(self):
+        """予測に使うモデルを読み込み、バンドルなら (予測器, マニフェスト)、joblibのモデルなら None を返す"""
+        registry = get_model_registry()
+        bundle = self._get_bundle(registry)
+        if bundle is None:
+            registry.get_disease_models(DISEASES)
+        self.model_source = "joblib" if bundle is None else "bundle"
+        return bundle
+
+    def _predict_batch(self, rows):
+        registry = get_model_registry()
+        bundle = self.load_models()
+        X = np.asarray(rows, dtype=np.float64)
+        started = time.perf_counter()
+        if bundle is not None:
+            compiled, manifest = bundle
+            predicted = compiled.predict_proba(X)
+            probabilities = predicted[:, [list(compiled.forests).index(disease) for disease in DISEASES]]
+            # バンドルには変換元のモデルファイルのハッシュが記録されているため、joblibと同じバージョンになる
+            versions = {
+                disease: (manifest["sources"].get(f"{disease}_model.joblib") or "")[:12] or None
+                for disease in DISEASES
+            }
+        else:
+            models, scaler = registry.get_disease_models(DISEASES)
+            probabilities = predict_risks_batch(models, scaler, X)[list(DISEASES)].to_numpy()
+            versions = {
+                disease: registry.version(os.path.join(self.model_dir, f"{disease}_model.joblib"))
+                for disease in DISEASES
+            }
+        get_latency_metrics().observe("service_predict_batch", time.perf_counter() - started)
+        return probabilities, versions
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _ in batch]
+            try:
+                probabilities, versions = await loop.run_in_executor(None, self._predict_batch, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), values in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result((dict(zip(DISEASES, values.tolist())), versions))
+
+
+class ScoringService:
+    """最小限のHTTP/1.1（keep-alive対応）で予測APIを提供するサーバー"""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle_predict(self, body):
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError:
+            raise RequestError(400, "JSONとして解釈できません")
+        row, values = parse_features(payload)
+
+        started = time.perf_counter()
+        probabilities, versions = await self.batcher.predict(row)
+        latency = time.perf_counter() - started
+
+        gender = "男性" if GENDER_CODES[values["性別"]] == 1 else "女性"
+        health_risks = calculate_health_risks(float(values["BMI"]), float(values["年齢"]), gender)
+        inputs = dict(zip(FEATURES, row))
+        get_prediction_logger().log(make_prediction_record(
+            model="disease_models",
+            model_version=versions,
+            inputs=inputs,
+            probabilities=probabilities,
+            latency_ms=latency * 1000,
+        ))
+        return {
+            "model_probabilities": probabilities,
+            "health_risks": health_risks,
+            "model_version": versions,
+            "bmi": inputs["BMI"],
+        }
+
+    def handle_stats(self):
+        return {
+            "batches": self.batcher.batches,
+            "rows": self.batcher.rows,
+            "mean_batch_size": self.batcher.rows / self.batcher.batches if self.batcher.batches else None,
+            "batch_window_ms": self.batcher.batch_window * 1000,
+            "model_source": self.batcher.model_source,
+        }
+
+    async def dispatch(self, method, path, body):
+        if path == "/predict":
+            if method != "POST":
+                raise RequestError(405, "POSTで送信してください")
+            return await self.handle_predict(body)
+        if path == "/health" and method == "GET":
+            return {"status": "ok"}
+        if path == "/stats" and method == "GET":
+            return self.handle_stats()
+        raise RequestError(404, "見つかりません")
+
+    async def respond(self, method, path, body):
+        """リクエストを処理し、(HTTPステータス, レスポンスのJSON) を返す"""
+        try:
+            return 200, await self.dispatch(method, path, body)
+        except RequestError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            print(f"予測中にエラーが発生しました: {e}")
+            return 500, {"error": "予測中にエラーが発生しました"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await read_request_head(reader)
+                except ValueError:  # リクエスト行・ヘッダーが長すぎる
+                    break
+                if head is None:
+                    break
+                method, path, headers = head
+
+                started = time.perf_counter()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    length = content_length(headers)
+                except RequestError as e:
+                    # 本文を読まずに応答するため、残りのバイトが次のリクエストとして
+                    # 解釈されないよう接続を閉じる
+                    status, response, keep_alive = e.status, {"error": e.message}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = await self.respond(method, path, body)
+
+                data = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_STATUS.get(status, 'Internal Server Error')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                get_latency_metrics().observe("service_request", time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8000, batch_window=DEFAULT_BATCH_WINDOW, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    """サービスを起動し、停止されるまで待つ関数"""
+    batcher = MicroBatcher(batch_window=batch_window, max_batch_size=max_batch_size)
+    # 最初のリクエストでモデルの読み込みを待たないよう、起動時に読み込んでおく
+    batcher.load_models()
+    batcher.start()
+    service = ScoringService(batcher)
+    server = await asyncio.start_server(service.handle_connection, host, port, backlog=1024)
+    print(
+        f"http://{host}:{port} で待ち受けています（バッチ待ち時間: {batch_window * 1000:g}ms, "
+        f"モデル: {batcher.model_source}）",
+        flush=True,
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW * 1000, help="リクエストをまとめる待ち時間（ミリ秒）")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.batch_window_ms / 1000, args.max_batch_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# user_store.py
+import json
+import os
+import threading
+
+from file_utils import atomic_write_json, file_lock
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USERS_FILE = os.path.join(BASE_DIR, "users.json")
+
+
+class UserStore:
+    """users.json の内容をメモリ上に保持するユーザー索引
+
+    ログイン時はファイルの更新日時・サイズを確認するだけで、変わっていなければ
+    メモリ上の辞書を引く。更新はファイルロックを取ったうえで最新の内容を読み直してから
+    書き込むため、複数のプロセスが同時に登録しても互いの書き込みを失わない。
+    """
+
+    def __init__(self, path=USERS_FILE):
+        self.path = path
+        self._users = {}
+        self._stat_key = None
+        self._lock = threading.RLock()
+
+    def _current_stat_key(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """ファイルが更新されていればメモリ上の索引を読み直す"""
+        stat_key = self._current_stat_key()
+        if stat_key == self._stat_key:
+            return
+        if stat_key is None:
+            self._users = {}
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._users = json.load(f)
+        self._stat_key = stat_key
+
+    def get(self, username):
+        """ユーザー情報を返す（存在しなければNone）"""
+        with self._lock:
+            self._refresh()
+            return self._users.get(username)
+
+    def exists(self):
+        """ユーザーデータのファイルが存在するかを返す"""
+        return os.path.exists(self.path)
+
+    def _modify(self, change):
+        """ファイルロック下で最新の内容に変更を適用し、書き戻す"""
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            users = dict(self._users)
+            result = change(users)
+            if result:
+                atomic_write_json(self.path, users)
+                self._users = users
+                self._stat_key = self._current_stat_key()
+            return result
+
+    def add(self, username, record):
+        """ユーザーを追加する（既に存在する場合はFalse）"""
+        def change(users):
+            if username in users:
+                return False
+            users[username] = record
+            return True
+
+        return self._modify(change)
+
+    def update(self, username, fields):
+        """既存ユーザーの項目を更新する（存在しない場合はFalse）"""
+        def change(users):
+            if username not in users:
+                return False
+            users[username] = {**users[username], **fields}
+            return True
+
+        return self._modify(change)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_user_store():
+    """プロセス全体で共有するユーザー索引を取得する関数"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UserStore()
+        return _store